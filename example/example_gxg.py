@@ -0,0 +1,3 @@
+from tsp import gxg
+
+gxg.main(inputfile='gxg.yaml')
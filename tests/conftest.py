@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp import storage
+
+# 3rd party
+import pandas as pd
+import numpy as np
+import pytest
+
+
+def random_series(name, freq, start, end, seed):
+    """series of two locations with two filters, with random gaps"""
+    rng = np.random.default_rng(seed)
+    parts = []
+    for location in ['A', 'B']:
+        for filternr in [1, 2]:
+            dates = pd.date_range(start, end, freq=freq)
+            dates = dates[rng.random(len(dates)) > 0.1]
+            index = pd.MultiIndex.from_arrays([
+                [location] * len(dates), [filternr] * len(dates), dates,
+            ], names=['location', 'filternr', 'date_time'])
+            parts.append(pd.Series(rng.normal(size=len(dates)),
+                                   index=index))
+    return pd.concat(parts).rename(name)
+
+
+@pytest.fixture
+def observed():
+    """daily observed series"""
+    return random_series('observed', 'D', '2003-06-01', '2006-06-01', 1)
+
+
+@pytest.fixture
+def model():
+    """weekly model series, extending beyond observed"""
+    return random_series('model', '7D', '2003-01-03', '2006-12-01', 2)
+
+
+@pytest.fixture
+def records(tmp_path, observed, model):
+    """observed and model records of series in HDF5 stores"""
+    records = []
+    for series in (observed, model):
+        path = str(tmp_path / '{}.h5'.format(series.name))
+        storage.write(path, 'series', series)
+        records.append({'name': series.name, 'file': path,
+                        'table': 'series'})
+    return records
@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp import csv2store, storage
+
+# 3rd party
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def csvfile(tmp_path, observed):
+    """CSV file of observed series with duplicate timestamps, the last of
+    which is kept"""
+    table = observed.rename('value').reset_index()
+    table['datetime'] = table.pop('date_time').dt.strftime('%Y%m%d')
+    duplicates = table.iloc[::50].copy()
+    duplicates['value'] += 1.
+    table = pd.concat([table, duplicates])
+    path = tmp_path / 'series.csv'
+    table.to_csv(path, index=False)
+    return str(path)
+
+
+def run(csvfile, storefile, **kwargs):
+    csv2store.run(csvfile=csvfile,
+                  datetimeformat='%Y%m%d',
+                  locationfield='location',
+                  filternrfield='filternr',
+                  datetimefield='datetime',
+                  valuefield='value',
+                  storefile=storefile,
+                  **kwargs)
+    return storage.read(storefile, 'series')
+
+
+@pytest.mark.parametrize('chunksize', [1000, 4000])
+def test_chunked_equals_unchunked(tmp_path, csvfile, chunksize):
+    unchunked = run(csvfile, str(tmp_path / 'unchunked.h5'))
+    chunked = run(csvfile, str(tmp_path / 'chunked.h5'),
+                  chunksize=chunksize)
+    pd.testing.assert_series_equal(chunked.sort_index(), unchunked,
+                                   check_names=False)
+
+
+def test_incremental_rerun_equals_full(tmp_path, csvfile):
+    storefile = str(tmp_path / 'incremental.h5')
+    run(csvfile, storefile, incremental=True)
+    table = pd.read_csv(csvfile)
+    table.loc[table['location'] == 'B', 'value'] *= 2.
+    table.to_csv(csvfile, index=False)
+    incremental = run(csvfile, storefile, incremental=True)
+    full = run(csvfile, str(tmp_path / 'full.h5'))
+    pd.testing.assert_series_equal(incremental.sort_index(), full,
+                                   check_names=False)
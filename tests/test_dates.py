@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp import dates
+
+# 3rd party
+import pandas as pd
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize('values, datetimeformat', [
+    (['20040114', '20040229', '20041231'], '%Y%m%d'),
+    (['200401140830', '200402292359'], '%Y%m%d%H%M'),
+    (['20040114083015', '19991231000001'], '%Y%m%d%H%M%S'),
+    (['01142004', '12312004'], '%m%d%Y'),
+])
+def test_numeric_strings_equal_to_datetime(values, datetimeformat):
+    assert dates.numeric_fields(datetimeformat) is not None
+    parsed = dates.to_datetime(values, format=datetimeformat)
+    expected = pd.to_datetime(values, format=datetimeformat)
+    pd.testing.assert_index_equal(parsed, expected.as_unit('ns'))
+
+
+def test_numeric_numbers_with_missing():
+    values = pd.Series([20040114., np.nan, 20041231.], name='date')
+    parsed = dates.to_datetime(values, format='%Y%m%d')
+    assert parsed.name == 'date'
+    assert parsed.iloc[0] == pd.Timestamp('20040114')
+    assert pd.isnull(parsed.iloc[1])
+    assert parsed.iloc[2] == pd.Timestamp('20041231')
+
+    integers = dates.to_datetime(np.array([20040114, 20041231]),
+                                 format='%Y%m%d')
+    assert list(integers) == [pd.Timestamp('20040114'),
+                              pd.Timestamp('20041231')]
+
+
+@pytest.mark.parametrize('values', [
+    ['20040230'],
+    ['20041301'],
+    ['2004011'],
+])
+def test_numeric_invalid_is_not_parsed(values):
+    assert dates.parse_numeric(values, dates.numeric_fields('%Y%m%d')) is None
+
+
+def test_other_format_parsed_once_per_value():
+    values = ['14-01-2004', '28-01-2004', '14-01-2004']
+    assert dates.numeric_fields('%d-%m-%Y') is None
+    parsed = dates.to_datetime(values, format='%d-%m-%Y')
+    pd.testing.assert_index_equal(
+        parsed, pd.to_datetime(values, format='%d-%m-%Y').as_unit('ns'))
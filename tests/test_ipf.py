@@ -0,0 +1,47 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp import ipf
+
+# 3rd party
+import numpy as np
+import pytest
+
+ROWS = [
+    ['20040114', '1.25', '3'],
+    ['20040128', '-999.99', '4'],
+    ['20040214', '0.5', 'x'],
+    ['-999', '2.0', '5'],
+]
+
+
+def write_txt(path, delimiter):
+    """iMOD txt file without associated file line, with nodata values of
+    date and head"""
+    lines = [str(len(ROWS)), '3', 'date,-999', 'head,-999.99', 'other']
+    lines += [delimiter.join(row) for row in ROWS]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+@pytest.mark.parametrize('delimiter', [' ', ','])
+def test_read_columns_equals_read(tmp_path, delimiter):
+    txtfile = write_txt(tmp_path / 'series.txt', delimiter)
+    rows = list(ipf.read(txtfile, hastxt=False, delimiter=delimiter,
+                         fill=np.nan))
+    columns = ipf.read_columns(txtfile, hastxt=False, delimiter=delimiter)
+    assert list(columns) == ['date', 'head', 'other']
+    for name, values in columns.items():
+        assert values.dtype == np.float64
+        np.testing.assert_array_equal(values, [r[name] for r in rows])
+
+
+def test_read_columns_usecols(tmp_path):
+    txtfile = write_txt(tmp_path / 'series.txt', ' ')
+    columns = ipf.read_columns(txtfile, hastxt=False,
+                               usecols=['date', 'head'])
+    assert list(columns) == ['date', 'head']
+    np.testing.assert_array_equal(columns['head'],
+                                  [1.25, np.nan, 0.5, 2.0])
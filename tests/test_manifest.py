@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp import manifest
+
+# 3rd party
+import pandas as pd
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def series():
+    """series of more locations than fit in one key batch"""
+    locations = ['L{:03d}'.format(i) for i in range(40)]
+    index = pd.MultiIndex.from_product([
+        locations, [1, 2], pd.date_range('2000-01-01', '2000-01-10'),
+    ], names=['location', 'filternr', 'date_time'])
+    values = np.arange(len(index), dtype=float)
+    return pd.Series(values, index=index, name='head')
+
+
+@pytest.fixture
+def store(tmp_path, series):
+    with pd.HDFStore(str(tmp_path / 'store.h5')) as store:
+        manifest.append(store, 'series', series)
+        yield store
+
+
+# keys of all locations, in two batches
+KEYS = [('L{:03d}'.format(i), 1 + i % 2) for i in range(40)]
+
+
+def test_select_rows(store, series):
+    selected = manifest.select_rows(store, 'series', KEYS).sort_index()
+    expected = series.loc[series.index.droplevel(2).isin(KEYS)]
+    pd.testing.assert_series_equal(selected, expected)
+
+
+def test_select_missing_key(store):
+    rows, coordinates = manifest.select_batch(store, 'series', [('X', 1)])
+    assert len(rows) == 0
+    assert len(coordinates) == 0
+
+
+def test_remove_rows(store, series):
+    manifest.remove_rows(store, 'series', KEYS)
+    expected = series.loc[~series.index.droplevel(2).isin(KEYS)]
+    pd.testing.assert_series_equal(store['series'].sort_index(), expected)
+
+
+def test_dedup_rows(store, series):
+    updated = series.loc[series.index.droplevel(2).isin(KEYS)] + 1000.
+    manifest.append(store, 'series', updated)
+    manifest.dedup_rows(store, 'series', KEYS)
+    expected = updated.combine_first(series)
+    pd.testing.assert_series_equal(store['series'].sort_index(), expected)
+
+
+def test_affected():
+    previous = pd.DataFrame([
+        ('a.txt', 'A', 1, 1, 1., 'x'),
+        ('b.txt', 'B', 1, 1, 1., 'y'),
+    ], columns=manifest.COLUMNS)
+    current = pd.DataFrame([
+        ('a.txt', 'A', 1, 1, 1., 'x'),
+        ('b.txt', 'B', 1, 1, 2., 'z'),
+        ('c.txt', 'C', 2, 1, 1., 'w'),
+    ], columns=manifest.COLUMNS)
+    assert manifest.affected(current, previous) == [('B', 1), ('C', 2)]
@@ -0,0 +1,61 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp import mxgl
+
+# 3rd party
+import pandas as pd
+import numpy as np
+import pytest
+
+INDICATORS = ['ghg', 'glg', 'gvg', 'q_ghg', 'q_glg', 'q_gvg']
+
+
+@pytest.fixture
+def panel():
+    """irregular six-hourly series of six filters"""
+    rng = np.random.default_rng(7)
+    candidates = pd.date_range('2001-03-01', '2006-06-01', freq='6h')
+    parts = []
+    for i in range(6):
+        n = rng.integers(50, 400)
+        dates = pd.DatetimeIndex(np.sort(rng.choice(candidates, n,
+                                                    replace=False)))
+        index = pd.MultiIndex.from_arrays([
+            ['L{:d}'.format(i // 2)] * n, [i % 2 + 1] * n, dates,
+        ], names=['location', 'filternr', 'date_time'])
+        parts.append(pd.Series(rng.normal(size=n).cumsum(), index=index))
+    return pd.concat(parts).sort_index()
+
+
+@pytest.mark.parametrize('fill_method, limit', [
+    ('linear', 15),
+    ('ffill', 10),
+    ('bfill', None),
+    (None, None),
+])
+@pytest.mark.parametrize('tmin, tmax', [
+    (None, None),
+    (pd.Timestamp('2002-01-01'), pd.Timestamp('2005-03-20')),
+])
+def test_panel_gxg_equals_series_methods(panel, fill_method, limit,
+                                         tmin, tmax):
+    gxg = mxgl.panel_gxg(panel, tmin=tmin, tmax=tmax,
+                         fill_method=fill_method, limit=limit)
+    assert list(gxg.columns) == INDICATORS
+    for (location, filternr), group in panel.groupby(level=[0, 1]):
+        series = group.droplevel([0, 1])
+        pair = mxgl.SeriesPair(series, series)
+        classic = {'fill_method': fill_method, 'limit': limit}
+        expected = [
+            pair.ghg(tmin=tmin, tmax=tmax, **classic),
+            pair.glg(tmin=tmin, tmax=tmax, **classic),
+            pair.gvg(tmin=tmin, tmax=tmax, **classic),
+            pair.q_ghg(tmin=tmin, tmax=tmax),
+            pair.q_glg(tmin=tmin, tmax=tmax),
+            pair.q_gvg(tmin=tmin, tmax=tmax),
+        ]
+        np.testing.assert_allclose(gxg.loc[(location, filternr)].values,
+                                   np.array(expected, dtype=float))
@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp import stats, storage
+
+# 3rd party
+import pandas as pd
+import numpy as np
+import pytest
+
+# std
+from collections import OrderedDict
+
+
+@pytest.mark.parametrize('direction', ['backward', 'forward', 'nearest'])
+@pytest.mark.parametrize('tolerance', [None, '5D'])
+def test_named_periods_equal_single_periods(records, direction,
+                                            tolerance):
+    observed, model = records
+    periods = OrderedDict([
+        ('a', (pd.Timestamp('20040115'), pd.Timestamp('20041231'))),
+        ('b', (pd.Timestamp('20040608'), pd.Timestamp('20050620'))),
+    ])
+    alignkwargs = {
+        'align_direction': direction,
+        'align_tolerance': tolerance,
+    }
+    read = lambda period: storage.read(observed['file'], 'series',
+                                       period=period).dropna()
+    union = (pd.Timestamp('20040115'), pd.Timestamp('20050620'))
+    _, named, _, _ = stats.scenario_sums(read(union), dict(model),
+                                         period=union, periods=periods,
+                                         **alignkwargs)
+    for name, period in periods.items():
+        _, single, _, _ = stats.scenario_sums(read(period), dict(model),
+                                              period=period, **alignkwargs)
+        pd.testing.assert_frame_equal(named.loc[name], single)
+
+
+def test_statistics_equal_direct_formulas(observed, model):
+    residuals = stats.align(observed, model) - observed
+    residuals.iloc[::7] = np.nan
+    assert stats.mean_error(residuals) == pytest.approx(residuals.mean())
+    assert stats.mean_absolute_error(residuals) == pytest.approx(
+        residuals.abs().mean())
+    assert stats.root_mean_square_error(residuals) == pytest.approx(
+        np.sqrt(residuals.pow(2).mean()))
+    assert stats.sum_of_squared_errors(residuals) == pytest.approx(
+        residuals.pow(2).sum())
+    assert stats.explained_variance_percentage(
+        observed, residuals) == pytest.approx(
+        (observed.var() - residuals.var()) / observed.var() * 100.)
+
+
+def test_sufficient_statistics_by_filter(observed, model):
+    residuals = stats.align(observed, model) - observed
+    summary = stats.statistics(stats.sufficient_statistics(observed,
+                                                           residuals))
+    for key, filterresiduals in residuals.groupby(level=[0, 1]):
+        filterobserved = observed.loc[filterresiduals.index]
+        expected = pd.Series({
+            'mean error': filterresiduals.mean(),
+            'mean absolute error': filterresiduals.abs().mean(),
+            'root mean square error': np.sqrt(
+                filterresiduals.pow(2).mean()),
+            'sum of squared errors': filterresiduals.pow(2).sum(),
+            'explained variance percentage': (
+                (filterobserved.var() - filterresiduals.var()) /
+                filterobserved.var() * 100.),
+        })
+        pd.testing.assert_series_equal(summary.loc[key], expected,
+                                       check_names=False)
+
+
+def test_rollup_summary_keeps_order_of_summary(observed, model):
+    residuals = stats.align(observed, model) - observed
+    filtersums = stats.sufficient_statistics(observed, residuals)
+    sums = pd.concat([filtersums, filtersums * 2.], keys=['b', 'a'],
+                     names=['scenario'])
+    md = pd.DataFrame({'layer': np.arange(len(filtersums)) % 2},
+                      index=filtersums.index)
+    codes = stats.rollup_codes(sums, md, ['layer'])
+    summary = stats.statistics(sums)
+    summarybylayer = stats.rollup_summary(sums, codes, ['layer'])
+    assert (list(summarybylayer.index.unique(level='scenario')) ==
+            list(summary.index.unique(level='scenario')))
+
+
+def test_rolling_statistics_equal_pandas_rolling(observed, model):
+    residuals = (stats.align(observed, model) - observed).dropna()
+    rolled = stats.rolling_statistics(residuals, '90D')
+    for _, group in residuals.groupby(level=[0, 1]):
+        series = group.droplevel([0, 1])
+        window = series.rolling('90D')
+        expected = pd.DataFrame(OrderedDict([
+            ('mean error', window.mean()),
+            ('mean absolute error', series.abs().rolling('90D').mean()),
+            ('root mean square error',
+             np.sqrt(series.pow(2).rolling('90D').mean())),
+        ]))
+        actual = rolled.loc[group.index, expected.columns]
+        np.testing.assert_allclose(actual.values, expected.values)
@@ -0,0 +1,36 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp import stats, storage
+
+# 3rd party
+import pandas as pd
+import pytest
+
+
+@pytest.mark.parametrize('direction', ['backward', 'forward', 'nearest'])
+@pytest.mark.parametrize('tolerance', [None, '5D'])
+@pytest.mark.parametrize('freq', ['year', 'month'])
+@pytest.mark.parametrize('period', [
+    ('20040115', '20050620'),
+    ('20040101', '20051231'),
+    ('20040301', '20040320'),
+])
+def test_cached_equals_uncached(records, direction, tolerance, freq,
+                                period):
+    observed, model = records
+    period = tuple(pd.Timestamp(t) for t in period)
+    alignkwargs = {
+        'align_direction': direction,
+        'align_tolerance': tolerance,
+    }
+    observedseries = storage.read(observed['file'], 'series',
+                                  period=period).dropna()
+    _, uncached, _, _ = stats.scenario_sums(observedseries, dict(model),
+                                            period=period, **alignkwargs)
+    _, cached, _, _ = stats.cached_scenario_sums(observed, model,
+                                                 period=period, freq=freq,
+                                                 **alignkwargs)
+    pd.testing.assert_frame_equal(cached, uncached, check_dtype=False)
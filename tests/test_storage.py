@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp import storage
+
+# 3rd party
+import pandas as pd
+import numpy as np
+import pytest
+
+
+def location_series(locations):
+    """series of locations with two filters of ten days"""
+    index = pd.MultiIndex.from_product([
+        locations, [1, 2], pd.date_range('2000-01-01', '2000-01-10'),
+    ], names=['location', 'filternr', 'date_time'])
+    return pd.Series(np.arange(len(index), dtype=float), index=index,
+                     name='head')
+
+
+STORES = ['store.h5', 'store.parquet', 'store.arrow']
+
+
+@pytest.mark.parametrize('storename', STORES)
+@pytest.mark.parametrize('hdf5format', ['fixed', 'table'])
+def test_roundtrip(tmp_path, storename, hdf5format):
+    series = location_series(['A', 'B', 'C'])
+    path = str(tmp_path / storename)
+    storage.write(path, 'series', series, hdf5format=hdf5format,
+                  partitionsize=20, rowgroupsize=7)
+    read = storage.read(path, 'series', cache=False)
+    pd.testing.assert_series_equal(read, series, check_names=False,
+                                   check_index_type=False)
+
+
+@pytest.mark.parametrize('storename', STORES)
+def test_read_selection(tmp_path, storename):
+    series = location_series(['A', 'B', 'C'])
+    path = str(tmp_path / storename)
+    storage.write(path, 'series', series, hdf5format='table',
+                  partitionsize=20)
+    period = (pd.Timestamp('2000-01-03'), pd.Timestamp('2000-01-05'))
+    keys = [('A', 2), ('C', 1)]
+    read = storage.read(path, 'series', period=period, keys=keys,
+                        cache=False)
+    expected = storage.select(series, period=period, keys=keys)
+    pd.testing.assert_series_equal(read, expected, check_names=False,
+                                   check_index_type=False)
+
+
+@pytest.mark.parametrize('storename', STORES[1:])
+@pytest.mark.parametrize('locations', [[9], [10], [9, 11], [13]])
+def test_read_integer_locations(tmp_path, storename, locations):
+    # partitions of locations 9, 10 and 11, 12 are not in string order
+    series = location_series([9, 10, 11, 12])
+    path = str(tmp_path / storename)
+    storage.write(path, 'series', series, partitionsize=40)
+    assert len(storage.partfiles(path, 'series')) > 1
+    read = storage.read(path, 'series', locations=locations, cache=False)
+    expected = storage.select(series, locations=locations)
+    pd.testing.assert_series_equal(read, expected, check_names=False,
+                                   check_index_type=False)
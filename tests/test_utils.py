@@ -0,0 +1,34 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp import utils
+
+# 3rd party
+import pandas as pd
+import pytest
+
+
+@pytest.mark.parametrize('exportformat', ['csv', 'csv.gz', 'parquet',
+                                          'hdf5'])
+def test_export_round_trip(tmp_path, observed, exportformat):
+    table = observed.to_frame()
+    path = utils.exportpath(str(tmp_path / 'series.csv'), exportformat)
+    utils.export(table, path, exportformat, chunksize=1000)
+    if exportformat in ('csv', 'csv.gz'):
+        exported = pd.read_csv(path, index_col=[0, 1, 2],
+                               parse_dates=['date_time'])
+    elif exportformat == 'parquet':
+        exported = pd.read_parquet(path)
+    else:
+        exported = pd.read_hdf(path, 'table')
+    pd.testing.assert_frame_equal(exported, table, check_index_type=False,
+                                  check_exact=False)
+
+
+def test_exportpath_replaces_extension():
+    assert utils.exportpath('a/summary.csv', 'csv.gz') == 'a/summary.csv.gz'
+    assert utils.exportpath('a/summary.csv.gz', 'hdf5') == 'a/summary.h5'
+    with pytest.raises(ValueError):
+        utils.exportpath('a/summary.csv', 'xlsx')
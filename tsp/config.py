@@ -7,6 +7,12 @@ from types import SimpleNamespace
 import yaml
 import os
 
+# C YAML loader if available
+try:
+    from yaml import CLoader as Loader
+except ImportError:
+    from yaml import Loader
+
 thisfolder = os.path.dirname(os.path.realpath(__file__))
 defaultconfigfile = r'config.yaml'
 userconfigfile = r'..\userconfig.yaml'
@@ -15,11 +21,11 @@ defaultconfigfile = os.path.join(thisfolder, defaultconfigfile)
 userconfigfile = os.path.join(thisfolder, userconfigfile)
 
 with open(defaultconfigfile) as y:
-    config_mapping = yaml.load(y)
+    config_mapping = yaml.load(y, Loader=Loader)
 
 if os.path.exists(userconfigfile):
     with open(userconfigfile) as y:
-        userconfig_mapping = yaml.load(y)
+        userconfig_mapping = yaml.load(y, Loader=Loader)
     if userconfig_mapping is not None:
         config_mapping = ChainMap(userconfig_mapping, config_mapping)
 
@@ -3,7 +3,8 @@
 # Tom van Steijn, Royal HaskoningDHV
 
 # package
-from tsp.config import config
+from tsp.config import config, Loader
+from tsp import dates, manifest, storage
 
 # 3rd party
 import pandas as pd
@@ -29,6 +30,46 @@ def get_parser():
     return parser
 
 
+def to_series(table, datetimefield, datetimeformat, valuefield):
+    """convert table with (location, filternr) index to series with
+    (location, filternr, date_time) index, last value of duplicate
+    timestamps is kept"""
+    # parse dates and append to index
+    timestamps = dates.to_datetime(table.pop(datetimefield),
+                                   format=datetimeformat)
+    table.set_index(timestamps, append=True, inplace=True)
+
+    # drop duplicates
+    table = table.groupby(level=[0, 1, 2]).last()
+
+    # select valuefield
+    table = table.loc[:, valuefield]
+
+    # sort index
+    return table.sort_index()
+
+
+def append_chunks(store, tablename, chunks, **kwargs):
+    """append chunks of CSV table to table in open store. Duplicates are
+    dropped within each chunk, duplicates of (location, filternr) spread
+    over more than one chunk are dropped in a final pass.
+    Keyword arguments are passed to to_series."""
+    nchunks = {}
+    for i, chunk in enumerate(chunks):
+        log.info('chunk {i:d}'.format(i=i + 1))
+        series = to_series(chunk, **kwargs)
+        manifest.append(store, tablename, series)
+        for key in set(zip(series.index.get_level_values(0),
+                           series.index.get_level_values(1))):
+            nchunks[key] = nchunks.get(key, 0) + 1
+
+    # final pass over filters spanning chunk boundaries
+    spanning = sorted(k for k, n in nchunks.items() if n > 1)
+    log.info('dropping duplicates of {n:d} filters spanning chunks'.format(
+        n=len(spanning)))
+    manifest.dedup_rows(store, tablename, spanning)
+
+
 def run(**kwargs):
     # unpack input from kwargs
     csvfile = kwargs['csvfile']
@@ -42,37 +83,82 @@ def run(**kwargs):
     valuefield = kwargs['valuefield']
     storefile = kwargs['storefile']
     tablename = kwargs.get('tablename', 'series')
+    incremental = kwargs.get('incremental', False)
+    chunksize = kwargs.get('chunksize')
+
+    # incremental and streaming writes append to a HDF5 table
+    if ((incremental or chunksize is not None) and
+            storage.storeformat(storefile) != storage.HDF5):
+        raise ValueError(('incremental and chunksize options require a HDF5 '
+                          'store, got {storefile:}').format(
+            storefile=storefile))
+
+    # incremental: skip if CSV file did not change since last run
+    if incremental:
+        with pd.HDFStore(storefile) as store:
+            previous = manifest.read(store, tablename)
+        if manifest.unchanged(csvfile, previous):
+            log.info('store {} is up to date'.format(
+                os.path.basename(storefile)))
+            return
+    else:
+        previous = None
 
     # read CSV file
     log.info('reading {file:}'.format(file=os.path.basename(csvfile)))
     index_cols = [locationfield, filternrfield]
     usecols = [locationfield, filternrfield, datetimefield, valuefield]
-    table = pd.read_csv(csvfile,
-                        delimiter=delimiter,
-                        decimal=decimal,
-                        index_col=index_cols,
-                        header=0,
-                        na_values=na_values,
-                        usecols=usecols,
-                        )
-
-    # parse dates and append to index
-    dates = pd.to_datetime(table.pop(datetimefield), format=datetimeformat)
-    table.set_index(dates, append=True, inplace=True)
-
-    # drop duplicates
-    table = table.groupby(level=[0, 1, 2]).last()
-
-    # select valuefield
-    table = table.loc[:, valuefield]
-
-    # sort index
-    table = table.sort_index()
+    reader = pd.read_csv(csvfile,
+                         delimiter=delimiter,
+                         decimal=decimal,
+                         index_col=index_cols,
+                         header=0,
+                         na_values=na_values,
+                         usecols=usecols,
+                         chunksize=chunksize,
+                         )
+
+    # stream chunks to HDF5 store
+    if chunksize is not None:
+        if incremental:
+            log.warning('incremental mode is not available for chunked '
+                        'reading, writing full table')
+        log.info('streaming to store {}'.format(os.path.basename(storefile)))
+        with pd.HDFStore(storefile) as store:
+            if tablename in store:
+                store.remove(tablename)
+            append_chunks(store, tablename, reader,
+                          datetimefield=datetimefield,
+                          datetimeformat=datetimeformat,
+                          valuefield=valuefield,
+                          )
+            manifest.remove(store, tablename)
+        return
+
+    table = to_series(reader,
+                      datetimefield=datetimefield,
+                      datetimeformat=datetimeformat,
+                      valuefield=valuefield,
+                      )
+
+    # incremental: select rows of (location, filternr) with changed data
+    if incremental:
+        current = manifest.from_series(csvfile, table)
+        keys = manifest.affected(current, previous)
+        if previous is not None:
+            log.info('{n:d} filters with changed data'.format(n=len(keys)))
+            table = table.loc[table.index.droplevel(2).isin(keys)]
 
     # write to HDF5 store
     log.info('writing to store {}'.format(os.path.basename(storefile)))
+    if not incremental:
+        storage.write(storefile, tablename, table)
+        return
     with pd.HDFStore(storefile) as store:
-        store.put(tablename, table)
+        if previous is not None:
+            manifest.replace(store, tablename, table, keys, current)
+        else:
+            manifest.put(store, tablename, table, current)
 
 
 def main(inputfile=None):
@@ -81,7 +167,7 @@ def main(inputfile=None):
         args = get_parser().parse_args()
         inputfile = args.inputfile
     with open(inputfile) as y:
-        kwargs = yaml.load(y)
+        kwargs = yaml.load(y, Loader=Loader)
         kwargs['inputfile'] = inputfile
     run(**kwargs)
 
@@ -0,0 +1,144 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# 3rd party
+import pandas as pd
+import numpy as np
+
+# std
+import logging
+import re
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+# number of digits of numeric format directives
+WIDTHS = {
+    'Y': 4,
+    'm': 2,
+    'd': 2,
+    'H': 2,
+    'M': 2,
+    'S': 2,
+}
+
+NUMERICFORMAT = re.compile(r'(%[YmdHMS])+')
+
+
+def numeric_fields(datetimeformat):
+    """list of format directives if datetimeformat is purely numeric
+    (e.g. '%Y%m%d'), otherwise None"""
+    if (datetimeformat is None) or (
+            NUMERICFORMAT.fullmatch(datetimeformat) is None):
+        return None
+    fields = datetimeformat[1::2]
+    if ('Y' not in fields) or (len(set(fields)) < len(fields)):
+        return None
+    return fields
+
+
+def to_integers(values, width):
+    """convert numeric values or digit strings to int64 array and boolean
+    mask of missing values, returns None if not possible"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values.astype(np.int64), np.zeros(len(values), dtype=bool)
+    if values.dtype.kind == 'f':
+        isnull = ~np.isfinite(values)
+        filled = np.where(isnull, 0., values)
+        if np.any(filled != np.floor(filled)):
+            return None
+        return filled.astype(np.int64), isnull
+    try:
+        strings = values.astype('U')
+    except (TypeError, ValueError):
+        return None
+    if strings.dtype.itemsize != 4 * width:
+        return None
+
+    # digits from UCS4 code points, shorter strings are padded with zeros
+    digits = (strings.view(np.uint32).reshape(-1, width) -
+              np.uint32(ord('0')))
+    if np.any(digits > 9):
+        return None
+    integers = np.zeros(len(strings), dtype=np.int64)
+    for j in range(width):
+        integers = integers * 10 + digits[:, j]
+    return integers, np.zeros(len(strings), dtype=bool)
+
+
+def parse_numeric(values, fields):
+    """parse purely numeric timestamps using integer arithmetic, returns
+    None if values do not fit the format"""
+    width = sum(WIDTHS[f] for f in fields)
+    converted = to_integers(values, width)
+    if converted is None:
+        return None
+    integers, isnull = converted
+
+    # split integers into fields, starting from the last field
+    ones = np.ones_like(integers)
+    zeros = np.zeros_like(integers)
+    parts = {'m': ones, 'd': ones, 'H': zeros, 'M': zeros, 'S': zeros}
+    remainder = integers
+    for field in reversed(fields):
+        base = 10 ** WIDTHS[field]
+        parts[field] = remainder % base
+        remainder = remainder // base
+    valid = isnull | (
+        (remainder == 0) &
+        (parts['Y'] >= 1678) & (parts['Y'] <= 2261) &
+        (parts['m'] >= 1) & (parts['m'] <= 12) &
+        (parts['d'] >= 1) & (parts['d'] <= 31) &
+        (parts['H'] < 24) & (parts['M'] < 60) & (parts['S'] < 60))
+    if not np.all(valid):
+        return None
+
+    months = (parts['Y'] - 1970) * 12 + (parts['m'] - 1)
+    monthstart = months.astype('M8[M]')
+    days = monthstart.astype('M8[D]') + (parts['d'] - 1).astype('m8[D]')
+
+    # day beyond end of month
+    if np.any((days.astype('M8[M]') != monthstart) & ~isnull):
+        return None
+
+    seconds = parts['H'] * 3600 + parts['M'] * 60 + parts['S']
+    parsed = (days.astype('M8[s]') + seconds.astype('m8[s]')).astype('M8[ns]')
+    parsed[isnull] = np.datetime64('NaT')
+    return parsed
+
+
+def parse_unique(values, datetimeformat):
+    """parse each distinct timestamp once and broadcast the result"""
+    codes, uniques = pd.factorize(np.asarray(values))
+    parsed = pd.to_datetime(uniques, format=datetimeformat)
+    parsed = np.asarray(parsed, dtype='M8[ns]')
+    return np.where(codes >= 0, parsed[codes], np.datetime64('NaT'))
+
+
+def to_datetime(values, format=None):
+    """Parse timestamps in values to datetimes.
+
+    Purely numeric formats (e.g. '%Y%m%d', '%Y%m%d%H%M') are parsed with
+    integer arithmetic. All other formats, or values not matching the
+    numeric format, are parsed once per distinct value with
+    pd.to_datetime.
+
+    Args:
+        values (Series or array-like): timestamps as strings or numbers
+        format (str, optional): strftime format of timestamps
+
+    Returns:
+        Series or DatetimeIndex: Series with same index and name if values
+        is a Series, otherwise DatetimeIndex
+    """
+    fields = numeric_fields(format)
+    parsed = None
+    if fields is not None:
+        parsed = parse_numeric(values, fields)
+    if parsed is None:
+        parsed = parse_unique(values, format)
+    if isinstance(values, pd.Series):
+        return pd.Series(parsed, index=values.index, name=values.name)
+    return pd.DatetimeIndex(parsed)
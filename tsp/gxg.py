@@ -0,0 +1,211 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp.config import config, Loader
+from tsp import mxgl, storage, utils
+from tsp.utils import export, exportpath, first_last
+
+# 3rd party
+import pandas as pd
+
+# std
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+import argparse
+import logging
+import time
+import yaml
+import os
+
+# indicators of mxgl.panel_gxg, differences of quantile indicators are the
+# d_ghg, d_glg and d_gvg of mxgl
+INDICATORS = ['ghg', 'glg', 'gvg', 'q_ghg', 'q_glg', 'q_gvg']
+
+
+def get_parser():
+    '''get argumentparser and add arguments
+    '''
+    parser = argparse.ArgumentParser(
+        'calculate GxG indicators for observed and model timeseries',
+    )
+
+    # Command line arguments
+    parser.add_argument('inputfile', type=str,
+                        help=('YAML input file containing keyword arguments'))
+    return parser
+
+
+def indicators(observed, model, period=None, fill_method='linear', limit=15,
+               q_high=0.94, q_low=0.06):
+    """GxG indicators of observed and model and model minus observed
+    differences by (location, filternr), columns '{indicator} observed',
+    '{indicator} model' and '{indicator} difference'"""
+    tmin, tmax = period if period is not None else (None, None)
+    gxgkwargs = {
+        'tmin': tmin,
+        'tmax': tmax,
+        'fill_method': fill_method,
+        'limit': limit,
+        'q_high': q_high,
+        'q_low': q_low,
+    }
+    observedgxg = mxgl.panel_gxg(observed, **gxgkwargs)
+    modelgxg = mxgl.panel_gxg(model, **gxgkwargs)
+    observedgxg, modelgxg = observedgxg.align(modelgxg, join='outer')
+    columns = OrderedDict()
+    for indicator in INDICATORS:
+        columns['{} observed'.format(indicator)] = observedgxg[indicator]
+        columns['{} model'.format(indicator)] = modelgxg[indicator]
+        columns['{} difference'.format(indicator)] = (
+            modelgxg[indicator] - observedgxg[indicator])
+    return pd.DataFrame(columns, index=observedgxg.index)
+
+
+def partition_worker(observed, model, kwargs):
+    """indicators of one partition of filters in worker process"""
+    return indicators(observed, model, **kwargs)
+
+
+def partitions(observed, model, areas):
+    """split observed and model by area of (location, filternr), filters
+    without metadata form one partition"""
+    filterareas = lambda s: areas.reindex(s.index.droplevel(2)).fillna('')
+    observedparts = dict(list(observed.groupby(
+        filterareas(observed).values)))
+    modelparts = dict(list(model.groupby(filterareas(model).values)))
+    names = sorted(set(observedparts) | set(modelparts))
+    empty = lambda s: s.iloc[:0]
+    return (names,
+            [observedparts.get(n, empty(observed)) for n in names],
+            [modelparts.get(n, empty(model)) for n in names])
+
+
+def run(**kwargs):
+    # unpack input from kwargs
+    metadata = kwargs['metadata']
+    observed = kwargs['observed']
+    model = kwargs['model']
+    period = kwargs.get('period')
+    locations = kwargs.get('locations')
+    selectareas = kwargs.get('areas')
+    workers = kwargs.get('workers', 1)
+    fill_method = kwargs.get('fill_method', config.GXG_FILL_METHOD)
+    limit = kwargs.get('limit', config.GXG_LIMIT)
+    q_high = kwargs.get('q_high', config.GXG_Q_HIGH)
+    q_low = kwargs.get('q_low', config.GXG_Q_LOW)
+    exportformat = kwargs.get('exportformat', config.STATS_EXPORTFORMAT)
+    exportfolder = kwargs['exportfolder']
+    gxgstore = kwargs.get('gxgstore')
+    gxgfileformat = kwargs.get('gxgfileformat', config.GXGFILEFORMAT)
+    gxgtableformat = kwargs.get('gxgtableformat', config.GXGTABLEFORMAT)
+
+    # create export folder if it does not exist
+    if not os.path.exists(exportfolder):
+        os.mkdir(exportfolder)
+
+    # read metadata
+    logging.info('reading metadata')
+    if storage.isstore(metadata['file']):
+        md = utils.table_from_record(metadata)
+    else:
+        index_cols = metadata.pop('index_cols')
+        md = utils.read_table(metadata.pop('file'), index_cols=index_cols)
+
+    md = md.groupby(level=[0, 1]).last()
+
+    areas = md.loc[:, metadata.pop('areafield')].astype(str)
+
+    # select filters by area
+    if selectareas is not None:
+        keys = areas.index[areas.isin([str(a) for a in selectareas])]
+    else:
+        keys = None
+
+    # convert period to datetime
+    if period is not None:
+        start, end = period
+        start = pd.to_datetime(start)
+        end = pd.to_datetime(end)
+        period = (start, end)
+
+    # read series from records, selecting period and filters
+    logging.info('reading observed timeseries')
+    observed = utils.table_from_record(observed,
+                                       period=period,
+                                       locations=locations,
+                                       keys=keys)
+    logging.info('reading model timeseries')
+    model = utils.table_from_record(model,
+                                    period=period,
+                                    locations=locations,
+                                    keys=keys)
+    if period is None:
+        start, end = first_last(observed, model)
+
+    # indicators by partition of filters in the same area
+    logging.info('calculating GxG indicators')
+    tic = time.perf_counter()
+    gxgkwargs = {
+        'period': period,
+        'fill_method': fill_method,
+        'limit': limit,
+        'q_high': q_high,
+        'q_low': q_low,
+    }
+    names, observedparts, modelparts = partitions(observed, model, areas)
+    if (workers > 1) and (len(names) > 1):
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(partition_worker,
+                                        observedparts, modelparts,
+                                        [gxgkwargs] * len(names)))
+    else:
+        results = [indicators(o, m, **gxgkwargs)
+                   for o, m in zip(observedparts, modelparts)]
+    table = pd.concat(results, axis=0).sort_index()
+    seconds = time.perf_counter() - tic
+    nrows = len(observed) + len(model)
+    logging.info(('calculated GxG indicators of {nfilters:d} filters in '
+                  '{nparts:d} partitions in {seconds:.1f} s, '
+                  '{filterrate:.1f} filters/s, {rowrate:.0f} rows/s').format(
+        nfilters=len(table),
+        nparts=len(names),
+        seconds=seconds,
+        filterrate=len(table) / max(seconds, 1e-9),
+        rowrate=nrows / max(seconds, 1e-9),
+    ))
+
+    # export indicators
+    gxgfile = exportpath(os.path.join(exportfolder, gxgfileformat.format(
+        observed=observed.name,
+        model=model.name,
+        start=start.strftime('%Y%m%d%H%M%S'),
+        end=end.strftime('%Y%m%d%H%M%S'),
+    )), exportformat)
+    logging.info('exporting GxG indicators to {}'.format(
+        os.path.basename(gxgfile)))
+    export(table, gxgfile, exportformat, key='gxg')
+
+    # write indicators as table to store
+    if gxgstore is not None:
+        tablename = gxgtableformat.format(observed=observed.name,
+                                          model=model.name)
+        logging.info('writing GxG indicators to table {}'.format(tablename))
+        storage.write(gxgstore, tablename, table)
+
+
+def main(inputfile=None):
+    # arguments from input file
+    if inputfile is None:
+        args = get_parser().parse_args()
+        inputfile = args.inputfile
+    with open(inputfile) as y:
+        kwargs = yaml.load(y, Loader=Loader)
+        kwargs['inputfile'] = inputfile
+    run(**kwargs)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG)
+    main()
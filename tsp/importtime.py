@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp.config import config
+
+# std
+import subprocess
+import argparse
+import logging
+import sys
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+# package root, added to path of measuring interpreter
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+MEASURE = (
+    'import sys, time\n'
+    'sys.path.insert(0, {root!r})\n'
+    'start = time.perf_counter()\n'
+    'import tsp.{module:}\n'
+    'print(time.perf_counter() - start)\n'
+)
+
+
+def get_parser():
+    '''get argumentparser and add arguments'''
+    parser = argparse.ArgumentParser(
+        'measure import time of entry points and check against budget',
+    )
+
+    # Command line arguments
+    parser.add_argument('modules', type=str, nargs='*',
+                        help=('entry point modules, '
+                              'default all modules with a budget'))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of fresh interpreters per module')
+    return parser
+
+
+def measure(module, repeat=3):
+    """minimum import time in seconds of tsp module in fresh interpreters"""
+    code = MEASURE.format(root=ROOT, module=module)
+    times = []
+    for i in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', code])
+        times.append(float(output.decode().strip().splitlines()[-1]))
+    return min(times)
+
+
+def run(modules=None, repeat=3):
+    """measure import times, returns list of modules over budget"""
+    budgets = config.IMPORTTIME_BUDGETS
+    modules = modules or sorted(budgets)
+    overbudget = []
+    for module in modules:
+        seconds = measure(module, repeat=repeat)
+        budget = budgets.get(module)
+        if (budget is not None) and (seconds > budget):
+            overbudget.append(module)
+            log.warning('{module:}: {seconds:.3f} s, over budget of '
+                        '{budget:.3f} s'.format(
+                            module=module, seconds=seconds, budget=budget))
+        else:
+            log.info('{module:}: {seconds:.3f} s'.format(
+                module=module, seconds=seconds))
+    return overbudget
+
+
+def main():
+    args = get_parser().parse_args()
+    overbudget = run(modules=args.modules, repeat=args.repeat)
+    if len(overbudget) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
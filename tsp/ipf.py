@@ -5,7 +5,9 @@
 from tsp import utils
 
 import numpy as np
+import pandas as pd
 
+from collections import OrderedDict
 import logging
 import shlex
 import os
@@ -22,28 +24,37 @@ def careful_float(value):
         return np.nan
 
 
+def read_header(f, converter=None, hastxt=True):
+    """read header of iMOD format .txt or .ipf file from open file object,
+    returns number of rows, column names and nodata values by column name"""
+    converter = converter or {}
+    line = lambda: f.readline().rstrip('\n')
+    nrows = int(line())
+    ncols = int(line())
+    names = []
+    nodatavalues = {}
+    for j in range(ncols):
+        name, *other = line().split(',')
+        name = utils.cleaned(name)
+        names.append(name)
+        if len(other) > 0:
+            nodatavalues[name] = converter.get(name,
+                                               careful_float)(other[0])
+    # last line of columns
+    if hastxt:
+        seriescol, seriesext = line().split(',')
+    return nrows, names, nodatavalues
+
+
 def read(textfile, converter=None, masked=True, fill=None, hastxt=True, delimiter=' '):
     """read iMOD format .txt or .ipf files"""
     log.info('reading {}'.format(os.path.basename(textfile)))
     converter = converter or {}
     with open(textfile) as f:
         line = lambda: f.readline().rstrip('\n')
-        nrows = int(line())
-        ncols = int(line())
-        names = []
-        nodatavalues = {}
-        for j in range(ncols):
-            name, *other = line().split(',')
-            name = utils.cleaned(name)
-            names.append(name)
-            if len(other) > 0:
-                nodatavalues[name] = converter.get(name,
-                                                   careful_float)(other[0])
-        # last line of columns
-        if hastxt:
-            seriescol, seriesext = line().split(',')
-            seriescol = int(seriescol)
-            seriesext = seriesext.lower()
+        nrows, names, nodatavalues = read_header(f,
+                                                 converter=converter,
+                                                 hastxt=hastxt)
 
         for i in range(nrows):
             if delimiter == ' ':
@@ -60,3 +71,47 @@ def read(textfile, converter=None, masked=True, fill=None, hastxt=True, delimite
                 yield row_masked
             else:
                 yield row_values
+
+
+def read_columns(textfile, converter=None, masked=True, fill=np.nan,
+                 hastxt=True, delimiter=' ', usecols=None):
+    """read iMOD format .txt or .ipf files to numpy arrays by column name
+
+    Parses the body in one pass with the pandas C parser instead of row by
+    row. Columns without a converter are returned as float64, non-numeric
+    values become NaN (like careful_float). Nodata values are masked with
+    fill."""
+    log.info('reading {}'.format(os.path.basename(textfile)))
+    converter = converter or {}
+    with open(textfile) as f:
+        nrows, names, nodatavalues = read_header(f,
+                                                 converter=converter,
+                                                 hastxt=hastxt)
+        if delimiter == ' ':
+            sep = r'\s+'
+        else:
+            sep = delimiter
+        body = pd.read_csv(f,
+                           sep=sep,
+                           header=None,
+                           names=names,
+                           index_col=False,
+                           usecols=usecols,
+                           nrows=nrows,
+                           converters={n: c for n, c in converter.items()
+                                       if n in names},
+                           skipinitialspace=True,
+                           )
+
+    columns = OrderedDict()
+    for name in body.columns:
+        values = body[name]
+        if name not in converter:
+            values = pd.to_numeric(values, errors='coerce').astype(float)
+        values = np.asarray(values)
+        if masked and (name in nodatavalues):
+            isnodata = values == nodatavalues[name]
+            if np.any(isnodata):
+                values = np.where(isnodata, fill, values)
+        columns[name] = values
+    return columns
@@ -4,13 +4,15 @@
 
 
 # package
-from tsp.config import config
-from tsp import ipf, utils
+from tsp.config import config, Loader
+from tsp import dates, ipf, manifest, storage, utils
 
 # 3rd party
 import pandas as pd
 
 # std
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
 import argparse
 import logging
 import yaml
@@ -31,6 +33,99 @@ def get_parser():
     return parser
 
 
+def read_modeltable(location, filternr, txtfile, delimiter, usecols):
+    """read model series from iMOD txt file to DataFrame with location and
+    filternr columns"""
+    columns = ipf.read_columns(txtfile,
+                               hastxt=False,
+                               delimiter=delimiter,
+                               usecols=usecols)
+    table = pd.DataFrame(columns)
+
+    table['location'] = location
+    table['filternr'] = filternr
+    return table
+
+
+def read_tables(jobs, delimiter, usecols, workers=1):
+    """read model tables for (location, filternr, txtfile) jobs, in order of
+    jobs. With more than one worker, files are parsed in a process pool with
+    at most two results in flight per worker."""
+    if workers > 1:
+        maxinflight = 2 * workers
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            inflight = deque()
+            for location, filternr, txtfile in jobs:
+                log.info('location {location:} filter {filternr:d}'.format(
+                    location=location,
+                    filternr=filternr,
+                ))
+                inflight.append(executor.submit(read_modeltable,
+                                                location, filternr, txtfile,
+                                                delimiter, usecols))
+                if len(inflight) >= maxinflight:
+                    yield inflight.popleft().result()
+            while inflight:
+                yield inflight.popleft().result()
+    else:
+        for location, filternr, txtfile in jobs:
+            log.info('location {location:} filter {filternr:d}'.format(
+                location=location,
+                filternr=filternr,
+            ))
+            yield read_modeltable(location, filternr, txtfile,
+                                  delimiter, usecols)
+
+
+def to_series(tables, datetimefield, datetimeformat, valuefield):
+    """merge model tables to series with (location, filternr, date_time)
+    index, last value of duplicate timestamps is kept"""
+    # merge to dataframe and set index
+    table = pd.concat(tables, axis=0)
+    log.info('converting timestamps to datetime')
+    table['date_time'] = dates.to_datetime(table[datetimefield],
+                                           format=datetimeformat)
+    table.set_index(['location', 'filternr', 'date_time'],
+                    drop=True,
+                    inplace=True)
+
+    # drop duplicates
+    table = table.groupby(level=[0, 1, 2]).last()
+
+    # select valuefield
+    table = table.loc[:, valuefield]
+
+    # sort index
+    return table.sort_index()
+
+
+def batched(iterable, size):
+    """yield lists of at most size items from iterable"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+def append_batches(store, tablename, batches, **kwargs):
+    """append batches of model tables to table in open store. Rows of a
+    (location, filternr) already written by an earlier batch are merged
+    with the new rows, keeping the last value of duplicate timestamps.
+    Keyword arguments are passed to to_series."""
+    written = set()
+    for tables in batches:
+        series = to_series(tables, **kwargs)
+        keys = set(zip(series.index.get_level_values(0),
+                       series.index.get_level_values(1)))
+        manifest.append(store, tablename, series)
+        manifest.dedup_rows(store, tablename, sorted(keys & written))
+        written |= keys
+
+
 def run(**kwargs):
     # unpack input from kwargs
     metadatafile = kwargs['metadatafile']
@@ -46,14 +141,24 @@ def run(**kwargs):
     valuefield = kwargs['valuefield']
     storefile = kwargs['storefile']
     tablename = kwargs.get('tablename', 'series')
+    workers = kwargs.get('workers', 1)
+    incremental = kwargs.get('incremental', False)
+    batchsize = kwargs.get('batchsize')
+
+    # incremental and streaming writes append to a HDF5 table
+    if ((incremental or batchsize is not None) and
+            storage.storeformat(storefile) != storage.HDF5):
+        raise ValueError(('incremental and batchsize options require a HDF5 '
+                          'store, got {storefile:}').format(
+            storefile=storefile))
 
     # read metadata
     index_cols = [locationfield, filternrfield]
     metadata = utils.read_table(metadatafile, index_cols=index_cols)
     modelids = metadata[modelidfield].dropna()
 
-    tables = []
-    for (location, filternr), modelid in modelids.iteritems():
+    jobs = []
+    for (location, filternr), modelid in modelids.items():
         txtfile = os.path.join(folder, fileformat.format(
             modelid=modelid,
         ))
@@ -65,46 +170,74 @@ def run(**kwargs):
                 filternr=filternr,
             ))
             continue
-        log.info('location {location:} filter {filternr:d}'.format(
-            location=location,
-            filternr=filternr,
-        ))
-        records = ipf.read(txtfile,
-                           hastxt=False,
-                           delimiter=delimiter)
-        table = pd.DataFrame(records)
-
-        table['location'] = location
-        table['filternr'] = filternr
+        jobs.append((location, filternr, txtfile))
 
-        tables.append(table)
+    # incremental: select jobs of (location, filternr) with changed files
+    if incremental:
+        with pd.HDFStore(storefile) as store:
+            previous = manifest.read(store, tablename)
+        current = manifest.from_files(jobs, previous=previous)
+        keys = manifest.affected(current, previous)
+        if previous is not None:
+            log.info('{n:d} filters with changed files'.format(n=len(keys)))
+            if not len(keys) > 0:
+                log.info('store {} is up to date'.format(
+                    os.path.basename(storefile)))
+                return
+            changedkeys = set(keys)
+            jobs = [j for j in jobs if (j[0], j[1]) in changedkeys]
+    else:
+        previous = None
 
-    if not len(tables) > 0:
+    if not len(jobs) > 0 and previous is None:
         log.warning('no output files available, exiting..')
         return
 
-    # merge to dataframe and set index
-    table = pd.concat(tables, axis=0)
-    log.info('converting timestamps to datetime')
-    table['date_time'] = pd.to_datetime(table[datetimefield],
-                                        format=datetimeformat)
-    table.set_index(['location', 'filternr', 'date_time'],
-                    drop=True,
-                    inplace=True)
-
-    # drop duplicates
-    table = table.groupby(level=[0, 1, 2]).last()
+    tables = read_tables(jobs,
+                         delimiter=delimiter,
+                         usecols=[datetimefield, valuefield],
+                         workers=workers,
+                         )
 
-    # select valuefield
-    table = table.loc[:, valuefield]
+    # stream batches of files to HDF5 store
+    if batchsize is not None:
+        log.info('streaming to store {}'.format(os.path.basename(storefile)))
+        with pd.HDFStore(storefile) as store:
+            if previous is not None:
+                manifest.remove_rows(store, tablename, keys)
+            elif tablename in store:
+                store.remove(tablename)
+            append_batches(store, tablename, batched(tables, batchsize),
+                           datetimefield=datetimefield,
+                           datetimeformat=datetimeformat,
+                           valuefield=valuefield,
+                           )
+            if incremental:
+                manifest.write(store, tablename, current)
+            else:
+                manifest.remove(store, tablename)
+        return
 
-    # sort index
-    table = table.sort_index()
+    tables = list(tables)
+    if len(tables) > 0:
+        table = to_series(tables,
+                          datetimefield=datetimefield,
+                          datetimeformat=datetimeformat,
+                          valuefield=valuefield,
+                          )
+    else:
+        table = None
 
     # write to HDF5 store
     log.info('writing to store {}'.format(os.path.basename(storefile)))
+    if not incremental:
+        storage.write(storefile, tablename, table)
+        return
     with pd.HDFStore(storefile) as store:
-        store.put(tablename, table)
+        if previous is not None:
+            manifest.replace(store, tablename, table, keys, current)
+        else:
+            manifest.put(store, tablename, table, current)
 
 
 def main(inputfile=None):
@@ -113,7 +246,7 @@ def main(inputfile=None):
         args = get_parser().parse_args()
         inputfile = args.inputfile
     with open(inputfile) as y:
-        kwargs = yaml.load(y)
+        kwargs = yaml.load(y, Loader=Loader)
         kwargs['inputfile'] = inputfile
     run(**kwargs)
 
@@ -3,19 +3,12 @@
 # Tom van Steijn, Royal HaskoningDHV
 
 # package
-from tsp.config import config
-from tsp import utils
+from tsp.config import config, Loader
+from tsp import storage, utils
+from tsp.plot import LOCATORS, pyplot
 
 # 3rd party
-from matplotlib import pyplot as plt
-from matplotlib import rcParams
-from matplotlib import dates
-from matplotlib import ticker
 import pandas as pd
-from bokeh.io import output_file, reset_output, save
-from bokeh.layouts import row
-from bokeh.plotting import figure
-from bokeh.models import CheckboxGroup, CustomJS, Range1d
 
 # std
 import argparse
@@ -23,21 +16,6 @@ import logging
 import yaml
 import os
 
-plt.style.use('classic')
-
-rcParams.update({
-    'font.family': 'arial',
-    'font.size': 8,
-    'figure.subplot.hspace': 0.1,
-    'figure.dpi': 200
-})
-
-LOCATORS = {
-    'y': dates.YearLocator,
-    'm': dates.MonthLocator,
-    'd': dates.DayLocator,
-}
-
 
 def get_parser():
     '''get argumentparser and add arguments
@@ -81,6 +59,11 @@ def plot_i(imagefile,
         TYPE: Description
     """
 
+    from bokeh.io import output_file, reset_output, save
+    from bokeh.layouts import row
+    from bokeh.plotting import figure
+    from bokeh.models import CheckboxGroup, CustomJS, Range1d
+
     # bokeh plot needs a pd.Series as x, not an index
     df = timeseries.reset_index()
 
@@ -169,6 +152,9 @@ def plot(imagefile,
     Returns:
         TYPE: Description
     """
+    plt = pyplot()
+    from matplotlib import ticker
+
     if figsize is None:
         fig, ax = plt.subplots()
     else:
@@ -264,6 +250,8 @@ def run(**kwargs):
     records = kwargs['records']
     resample_freq = kwargs.get('resample_freq')
     period = kwargs.get('period')
+    locations = kwargs.get('locations')
+    selectareas = kwargs.get('areas')
     xmajortickfrequency = kwargs.get('xmajortickfrequency')
     xminortickfrequency = kwargs.get('xminortickfrequency')
     ylim = kwargs.get('ylim')
@@ -305,7 +293,7 @@ def run(**kwargs):
 
     # read metadata
     logging.info('reading metadata')
-    if metadata['file'].lower().endswith('.h5'):
+    if storage.isstore(metadata['file']):
         md = utils.table_from_record(metadata)
     else:
         index_cols = metadata.pop('index_cols')
@@ -333,6 +321,23 @@ def run(**kwargs):
     # included filters
     included = md.loc[:, metadata.pop('includefield')].astype(bool)
 
+    # select included filters to read by area and location, if given
+    if selectareas is not None:
+        isselected = included & areas.isin([str(a) for a in selectareas])
+        if locations is not None:
+            isselected &= isselected.index.get_level_values(0).isin(
+                locations)
+        if clustered:
+            bylocation = isselected.groupby(level=0).any()
+            selectedlocations = list(bylocation.index[bylocation])
+            keys = None
+        else:
+            selectedlocations = None
+            keys = list(isselected.index[isselected])
+    else:
+        selectedlocations = locations
+        keys = None
+
     if clustered:
         # sidetext variables
         sidevars = pd.DataFrame({
@@ -356,12 +361,6 @@ def run(**kwargs):
             'bottomfilter': bottomfilters,
         })
 
-    # read series and attrs from records
-    logging.info('reading timeseries')
-    ss = {r['label']: utils.table_from_record(r) for r in records}
-    ss = pd.DataFrame(ss)
-    attrs = {r.pop('label'): r for r in records}
-
     # convert period to datetime
     if period is not None:
         start, end = period
@@ -369,6 +368,22 @@ def run(**kwargs):
         end = pd.to_datetime(end)
         period = (start, end)
 
+    # select period on read, unless series are resampled first
+    if resample_freq is None:
+        readperiod = period
+    else:
+        readperiod = None
+
+    # read series and attrs from records
+    logging.info('reading timeseries')
+    ss = {r['label']: utils.table_from_record(r,
+                                              period=readperiod,
+                                              locations=selectedlocations,
+                                              keys=keys)
+          for r in records}
+    ss = pd.DataFrame(ss)
+    attrs = {r.pop('label'): r for r in records}
+
     # resample and/or truncate series
     if (resample_freq is not None) and (period is not None):
         logging.info('resampling and truncating timeseries')
@@ -389,14 +404,6 @@ def run(**kwargs):
               .stack([1, 2])
               .reorder_levels([1, 2, 0])
               .sort_index())
-    elif period is not None:
-        logging.info('truncating timeseries')
-        ss = (ss
-              .unstack(level=[0, 1])
-              .truncate(before=start, after=end)
-              .stack([1, 2])
-              .reorder_levels([1, 2, 0])
-              .sort_index())
 
     if testone:
         if clustered:
@@ -549,7 +556,7 @@ def main(inputfile=None):
         args = get_parser().parse_args()
         inputfile = args.inputfile
     with open(inputfile) as y:
-        kwargs = yaml.load(y)
+        kwargs = yaml.load(y, Loader=Loader)
         kwargs['inputfile'] = inputfile
     run(**kwargs)
 
@@ -0,0 +1,232 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp.config import config
+
+# 3rd party
+import pandas as pd
+import numpy as np
+
+# std
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+COLUMNS = ['file', 'location', 'filternr', 'size', 'mtime', 'hash']
+
+
+def manifestkey(tablename):
+    """store key of manifest belonging to table"""
+    return '{tablename:}_manifest'.format(tablename=tablename)
+
+
+def filehash(filepath, blocksize=2 ** 20):
+    """MD5 hash of file content"""
+    md5 = hashlib.md5()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def signature(filepath, previous=None):
+    """size, modification time and content hash of file. The content hash
+    in previous (dict of (size, mtime, hash) by file) is reused if size and
+    mtime did not change"""
+    stat = os.stat(filepath)
+    size = stat.st_size
+    mtime = stat.st_mtime
+    if (previous is not None) and (filepath in previous):
+        prevsize, prevmtime, prevhash = previous[filepath]
+        if (prevsize == size) and (prevmtime == mtime):
+            return size, mtime, prevhash
+    return size, mtime, filehash(filepath)
+
+
+def signatures(manifest):
+    """dict of (size, mtime, hash) by file in manifest"""
+    if manifest is None:
+        return {}
+    return {r.file: (r.size, r.mtime, r.hash)
+            for r in manifest.itertuples(index=False)}
+
+
+def read(store, tablename):
+    """read manifest of table from open store, returns None if the store
+    holds no manifest or the table is not in (appendable) table format"""
+    key = manifestkey(tablename)
+    if (key not in store) or (tablename not in store):
+        return None
+    if not store.get_storer(tablename).is_table:
+        return None
+    return store[key]
+
+
+def write(store, tablename, manifest):
+    """write manifest of table to open store"""
+    store.put(manifestkey(tablename), manifest)
+
+
+def remove(store, tablename):
+    """remove manifest of table from open store, if any"""
+    key = manifestkey(tablename)
+    if key in store:
+        store.remove(key)
+
+
+def from_files(jobs, previous=None):
+    """manifest of source files
+
+    Args:
+        jobs (list): (location, filternr, file) tuples
+        previous (DataFrame, optional): previous manifest to reuse hashes
+
+    Returns:
+        DataFrame: manifest with one row per job
+    """
+    previous = signatures(previous)
+    rows = []
+    for location, filternr, filepath in jobs:
+        size, mtime, hash_ = signature(filepath, previous=previous)
+        rows.append((filepath, location, filternr, size, mtime, hash_))
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def from_series(filepath, series):
+    """manifest of single source file holding many filters. The hash of
+    each (location, filternr) row is a hash of its parsed data, so only
+    filters of which the data changed are affected."""
+    stat = os.stat(filepath)
+    rowhashes = pd.util.hash_pandas_object(series, index=True)
+    keyhashes = rowhashes.groupby(level=[0, 1]).sum()
+    manifest = pd.DataFrame({
+        'file': filepath,
+        'location': keyhashes.index.get_level_values(0),
+        'filternr': keyhashes.index.get_level_values(1),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'hash': ['{:016x}'.format(h) for h in keyhashes.values],
+    }, columns=COLUMNS)
+    return manifest
+
+
+def unchanged(filepath, previous):
+    """True if size and mtime of single source file match all previous
+    manifest rows"""
+    if (previous is None) or not len(previous) > 0:
+        return False
+    stat = os.stat(filepath)
+    return bool((previous['file'] == filepath).all() and
+                (previous['size'] == stat.st_size).all() and
+                (previous['mtime'] == stat.st_mtime).all())
+
+
+def affected(current, previous):
+    """sorted list of (location, filternr) keys of which a source file was
+    added, removed or changed between previous and current manifest"""
+    if previous is None:
+        previous = pd.DataFrame([], columns=COLUMNS)
+    entries = lambda m: set(zip(m['file'], m['location'],
+                                m['filternr'].astype(int), m['hash']))
+    changes = entries(current) ^ entries(previous)
+    return sorted({(location, filternr)
+                   for _, location, filternr, _ in changes})
+
+
+def put(store, tablename, series, manifest):
+    """write full series in appendable table format with its manifest"""
+    store.put(tablename, series,
+              format='table',
+              min_itemsize={series.index.names[0]:
+                            config.STORE_LOCATION_ITEMSIZE},
+              )
+    write(store, tablename, manifest)
+
+
+def key_batches(keys, batchsize=config.STORE_KEYBATCHSIZE):
+    """split (location, filternr) keys into batches of all keys of at most
+    batchsize locations"""
+    bylocation = OrderedDict()
+    for location, filternr in sorted(keys):
+        bylocation.setdefault(location, []).append(filternr)
+    locations = list(bylocation)
+    for i in range(0, len(locations), batchsize):
+        yield [(location, filternr)
+               for location in locations[i:i + batchsize]
+               for filternr in bylocation[location]]
+
+
+def batchwhere(store, tablename, keys):
+    """where condition selecting rows of all locations of keys in table"""
+    locationlevel = store.get_storer(tablename).levels[0]
+    return '{ll:} in {locations!r}'.format(
+        ll=locationlevel,
+        locations=sorted({str(location) for location, _ in keys}),
+    )
+
+
+def select_batch(store, tablename, keys):
+    """select rows of batch of (location, filternr) keys from table with a
+    single query, returns rows and their coordinates in table. Rows are
+    read by coordinates, without querying the table again."""
+    where = batchwhere(store, tablename, keys)
+    coordinates = np.asarray(store.select_as_coordinates(tablename,
+                                                         where=where))
+    if not len(coordinates) > 0:
+        # empty coordinates select all rows
+        return store.select(tablename, stop=0), coordinates
+    rows = store.select(tablename, where=coordinates)
+    iskey = rows.index.droplevel(list(range(2, rows.index.nlevels))).isin(
+        keys)
+    return rows.loc[iskey], coordinates[iskey]
+
+
+def select_rows(store, tablename, keys):
+    """select rows of (location, filternr) keys from table, one query per
+    batch of keys"""
+    return pd.concat([select_batch(store, tablename, batch)[0]
+                      for batch in key_batches(keys)], axis=0)
+
+
+def remove_rows(store, tablename, keys):
+    """remove rows of (location, filternr) keys from table, one query per
+    batch of keys"""
+    for batch in key_batches(keys):
+        _, coordinates = select_batch(store, tablename, batch)
+        if len(coordinates) > 0:
+            store.remove(tablename, where=coordinates)
+
+
+def append(store, tablename, series):
+    """append series to table in appendable table format"""
+    store.append(tablename, series,
+                 min_itemsize={series.index.names[0]:
+                               config.STORE_LOCATION_ITEMSIZE},
+                 )
+
+
+def dedup_rows(store, tablename, keys):
+    """drop duplicate timestamps in rows of (location, filternr) keys in
+    table, keeping the last appended value. Keys are deduplicated in
+    batches, so only rows of one batch are in memory."""
+    for batch in key_batches(keys):
+        rows, coordinates = select_batch(store, tablename, batch)
+        if not len(rows) > 0:
+            continue
+        rows = rows.groupby(level=[0, 1, 2]).last().sort_index()
+        store.remove(tablename, where=coordinates)
+        append(store, tablename, rows)
+
+
+def replace(store, tablename, series, keys, manifest):
+    """replace rows of (location, filternr) keys in table by series and
+    write manifest. Rows of other keys are left untouched."""
+    remove_rows(store, tablename, keys)
+    if (series is not None) and (len(series) > 0):
+        append(store, tablename, series)
+    write(store, tablename, manifest)
@@ -2,8 +2,64 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
+# package
+from tsp import utils
+
+# 3rd party
+import pandas as pd
 import numpy as np
 
+# std
+from collections import OrderedDict
+
+
+def daily(self, key, tmin=None, tmax=None):
+    """Daily mean and median values of series, resampled once.
+
+    Parameters
+    ----------
+    key : str
+        timeseries key ('observations' or 'simulated')
+    tmin, tmax: Optional[pd.Timestamp]
+        Time indices to use for the simulation of the time series model.
+
+    Returns
+    -------
+    pd.DataFrame
+        'mean' and 'median' with daily datetime index
+    """
+    resampler = self.bykey(key=key, tmin=tmin, tmax=tmax).resample('D')
+    return pd.DataFrame(OrderedDict([
+        ('mean', resampler.mean()),
+        ('median', resampler.median()),
+    ]))
+
+
+def yearly(self, key, tmin=None, tmax=None, fill_method='linear',
+           limit=15):
+    """Classic yearly GHG, GLG and GVG of daily mean values sampled on every
+    14th and 28th of the month.
+
+    Parameters
+    ----------
+    key : str
+        timeseries key ('observations' or 'simulated')
+    tmin, tmax: Optional[pd.Timestamp]
+        Time indices to use for the simulation of the time series model.
+    fill_method : str or None
+        fill method for interpolation to 14th and 28th of the month, see
+        sample_grid
+    limit : int or None
+        Maximum number of timesteps to fill using fill method, use None to
+        fill all
+
+    Returns
+    -------
+    pd.DataFrame
+        yearly values, see series_yearly
+    """
+    return series_yearly(self.daily(key=key, tmin=tmin, tmax=tmax)['mean'],
+                         fill_method=fill_method, limit=limit)
 
 def q_ghg(self, tmin=None, tmax=None, key='simulated', q=0.94):
         """Gemiddeld Hoogste Grondwaterstand (GHG) also called MHGL (Mean High Groundwater Level)
@@ -27,8 +83,7 @@ def q_ghg(self, tmin=None, tmax=None, key='simulated', q=0.94):
         TYPE
             Description
         """
-        series = self.bykey(key=key, tmin=tmin, tmax=tmax)
-        series = series.resample('d').median()
+        series = self.daily(key=key, tmin=tmin, tmax=tmax)['median']
         return series.quantile(q)
 
 def q_glg(self, tmin=None, tmax=None, key='simulated', q=0.06):
@@ -52,8 +107,7 @@ def q_glg(self, tmin=None, tmax=None, key='simulated', q=0.06):
     TYPE
         Description
     """
-    series = self.bykey(key=key, tmin=tmin, tmax=tmax)
-    series = series.resample('d').median()
+    series = self.daily(key=key, tmin=tmin, tmax=tmax)['median']
     return series.quantile(q)
 
 def __inspring__(self, series):
@@ -92,8 +146,7 @@ def q_gvg(self, tmin=None, tmax=None, key='simulated'):
     TYPE
         Description
     """
-    series = self.bykey(key=key, tmin=tmin, tmax=tmax)
-    series = series.resample('d').median()
+    series = self.daily(key=key, tmin=tmin, tmax=tmax)['median']
     inspring = self.__inspring__(series)
     if np.any(inspring):
         return series.loc[inspring].median()
@@ -151,15 +204,16 @@ def d_gvg(self, tmin=None, tmax=None):
     return (self.q_gvg(tmin=tmin, tmax=tmax, key='simulated') -
             self.q_gvg(tmin=tmin, tmax=tmax, key='observations'))
 
-def gxg(self, year_agg, tmin, tmax, key, fill_method, limit, output):
+def gxg(self, statistic, tmin, tmax, key, fill_method, limit, output):
     """Worker method for classic GXG statistics.
-    Resampling the series to every 14th and 28th of the month.
+    Sampling the series on every 14th and 28th of the month, see
+    yearly.
     Taking the mean of aggregated values per year.
 
     Parameters
     ----------
-    year_agg : function series -> scalar
-        Aggregator function to one value per year
+    statistic : str
+        yearly statistic 'ghg', 'glg' or 'gvg'
     tmin, tmax : Optional[pd.Timestamp]
         Time indices to use for the simulation of the time series model.
     key : None, optional
@@ -186,23 +240,10 @@ def gxg(self, year_agg, tmin, tmax, key, fill_method, limit, output):
     ValueError
         When output argument is unknown
     """
-    series = self.bykey(key=key, tmin=tmin, tmax=tmax)
-    series = series.resample('d').mean()
-    if fill_method is None:
-        series = series.dropna()
-    elif fill_method == 'ffill':
-        series = series.ffill(limit=limit)
-    elif fill_method == 'bfill':
-        series = series.bfill(limit=limit)
-    else:
-        series = series.interpolate(method=fill_method, limit=limit)
-
-    the14or28 = lambda x: (x.day == 14) or (x.day == 28)
-    is14or28 = series.index.map(the14or28)
-    if not np.any(is14or28):
+    yearly = self.yearly(key=key, tmin=tmin, tmax=tmax,
+                         fill_method=fill_method, limit=limit)[statistic]
+    if not len(yearly) > 0:
         return np.nan
-    series = series.loc[is14or28]
-    yearly = series.resample('a').apply(year_agg)
     if output == 'yearly':
         return yearly
     elif output == 'mean':
@@ -242,8 +283,7 @@ def ghg(self, tmin=None, tmax=None, key='simulated',
     pd.Series or scalar
         Series of yearly values or mean of yearly values
     """
-    mean_high = lambda s: s.nlargest(3).mean()
-    return self.gxg(mean_high, tmin=tmin, tmax=tmax, key=key,
+    return self.gxg('ghg', tmin=tmin, tmax=tmax, key=key,
                     fill_method=fill_method, limit=limit, output=output)
 
 def glg(self, tmin=None, tmax=None, key='simulated',
@@ -277,31 +317,9 @@ def glg(self, tmin=None, tmax=None, key='simulated',
     pd.Series or scalar
         Series of yearly values or mean of yearly values
     """
-    mean_low = lambda s: s.nsmallest(3).mean()
-    return self.gxg(mean_low, tmin=tmin, tmax=tmax, key=key,
+    return self.gxg('glg', tmin=tmin, tmax=tmax, key=key,
                     fill_method=fill_method, limit=limit, output=output)
 
-def __mean_spring__(self, series):
-    """Determine mean of timeseries values in spring.
-
-    Year aggregator function for gvg method.
-
-    Parameters
-    ----------
-    series : pd.Series
-        series with datetime index
-
-    Returns
-    -------
-    float
-        Mean of series, or NaN if no values in spring
-    """
-    inspring = self.__inspring__(series)
-    if np.any(inspring):
-        return series.loc[inspring].mean()
-    else:
-        return np.nan
-
 def gvg(self, tmin=None, tmax=None, key='simulated',
         fill_method='linear', limit=15, output='mean'):
     """Classic method:
@@ -333,5 +351,527 @@ def gvg(self, tmin=None, tmax=None, key='simulated',
     pd.Series or scalar
         Series of yearly values or mean of yearly values
     """
-    return self.gxg(self.__mean_spring__, tmin=tmin, tmax=tmax, key=key,
+    return self.gxg('gvg', tmin=tmin, tmax=tmax, key=key,
                     fill_method=fill_method, limit=limit, output=output)
+
+
+# panel methods, for all (location, filternr) series in a MultiIndex series
+
+# spring from 14 March up to and including 14 April, as (month, day)
+SPRINGSTART = (3, 14)
+SPRINGEND = (4, 14)
+
+
+def month_day(days):
+    """Month and day of month of days since epoch.
+
+    Parameters
+    ----------
+    days : np.ndarray
+        integer days since 1970-01-01
+
+    Returns
+    -------
+    tuple of np.ndarray
+        month (1-12) and day of month (1-31)
+    """
+    dates = np.asarray(days, dtype='M8[D]')
+    months = dates.astype('M8[M]')
+    month = months.astype(np.int64) % 12 + 1
+    day = (dates - months.astype('M8[D]')).astype(np.int64) + 1
+    return month, day
+
+
+def is_spring(days):
+    """Test if days since epoch are between 14 March and 15 April.
+
+    Parameters
+    ----------
+    days : np.ndarray
+        integer days since 1970-01-01
+
+    Returns
+    -------
+    np.ndarray
+        boolean array
+    """
+    month, day = month_day(days)
+    return (((month == SPRINGSTART[0]) & (day >= SPRINGSTART[1])) |
+            ((month == SPRINGEND[0]) & (day <= SPRINGEND[1])))
+
+
+def panel_days(series, tmin=None, tmax=None):
+    """Daily mean and median values of all filters in panel series, on
+    days with values only.
+
+    Parameters
+    ----------
+    series : pd.Series
+        series with MultiIndex (location, filternr, date_time)
+    tmin, tmax : Optional[pd.Timestamp]
+        Time indices to select
+
+    Returns
+    -------
+    dict
+        'groups': MultiIndex (location, filternr) of filters,
+        'filter': filter number (position in groups) by day,
+        'day': integer days since 1970-01-01 by day,
+        'mean': daily mean, 'median': daily median
+    """
+    series = series.dropna()
+    if not series.index.is_monotonic_increasing:
+        series = series.sort_index()
+    dates = series.index.get_level_values(2)
+    isselected = np.ones(len(series), dtype=bool)
+    if tmin is not None:
+        isselected &= dates >= pd.Timestamp(tmin)
+    if tmax is not None:
+        isselected &= dates <= pd.Timestamp(tmax)
+    series = series.loc[isselected]
+
+    ids, groups = utils.group_ids(series.index)
+    days = np.asarray(series.index.get_level_values(2),
+                      dtype='M8[D]').astype(np.int64)
+    values = np.asarray(series, dtype=float)
+
+    # rows are sorted by filter and day, a day starts where either changes
+    isfirst = np.ones(len(values), dtype=bool)
+    isfirst[1:] = (ids[1:] != ids[:-1]) | (days[1:] != days[:-1])
+    cell = np.cumsum(isfirst) - 1
+    starts = np.flatnonzero(isfirst)
+    counts = np.diff(np.append(starts, len(values)))
+
+    # median from values sorted within day
+    ordered = values[np.lexsort((values, cell))]
+    median = (ordered[starts + (counts - 1) // 2] +
+              ordered[starts + counts // 2]) / 2.
+    return {
+        'groups': groups,
+        'filter': ids[starts],
+        'day': days[starts],
+        'mean': np.bincount(cell, weights=values) / counts,
+        'median': median,
+    }
+
+
+def ragged_quantile(ids, values, ngroups, q):
+    """Quantile with linear interpolation of values by group id.
+
+    Parameters
+    ----------
+    ids : np.ndarray
+        group id by value
+    values : np.ndarray
+        values, no NaN
+    ngroups : int
+        number of groups
+    q : float
+        quantile
+
+    Returns
+    -------
+    np.ndarray
+        quantile by group, NaN for groups without values
+    """
+    order = np.lexsort((values, ids))
+    ordered = values[order]
+    counts = np.bincount(ids, minlength=ngroups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    position = q * (counts - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, counts - 1)
+    fraction = position - lower
+    quantile = np.full(ngroups, np.nan)
+    hasvalues = counts > 0
+    lowervalue = ordered[(starts + lower)[hasvalues]]
+    uppervalue = ordered[(starts + upper)[hasvalues]]
+    quantile[hasvalues] = (lowervalue +
+                           (uppervalue - lowervalue) * fraction[hasvalues])
+    return quantile
+
+
+# columns of sampling grid: 14th and 28th of each month
+GRIDMONTHS = np.repeat(np.arange(12), 2)
+GRIDDAYS = np.tile([13, 27], 12)
+
+# columns of sampling grid in spring: 14 March, 28 March and 14 April
+GRIDSPRING = [4, 5, 6]
+
+
+def sample_grid(days, fill_method='linear', limit=15):
+    """Sample daily mean values of all filters on the 14th and 28th of each
+    month, without resampling to a full daily axis. Values on grid days
+    are found with searchsorted on the days with values and filled like
+    pandas ffill / bfill / interpolate with forward limit, as if the
+    daily series from first to last day of each filter were filled.
+
+    Parameters
+    ----------
+    days : dict
+        'filter', 'day' and 'mean' of days with values, sorted by filter
+        and day, see panel_days
+    fill_method : str or None
+        'ffill', 'bfill', 'linear' (or 'time', 'index', equal for daily
+        values), use None to omit filling and drop NaNs
+    limit : int or None
+        Maximum number of timesteps to fill using fill method, use None to
+        fill all
+
+    Returns
+    -------
+    dict
+        'filter', 'year': filter number and year by grid row,
+        'day': (rows x 24) days since epoch of grid,
+        'isinrange': (rows x 24) grid day between first and last day,
+        'values': (rows x 24) sampled values, NaN if not filled or outside
+        first and last day of filter
+
+    Raises
+    ------
+    ValueError
+        When fill method is not supported
+    """
+    if fill_method not in (None, 'ffill', 'bfill', 'linear', 'time',
+                           'index'):
+        raise ValueError('{fill_method:} is not a supported fill method'
+                         .format(fill_method=fill_method))
+
+    cellfilter = days['filter']
+    cellday = days['day']
+    cellmean = days['mean']
+    isfirst = np.ones(len(cellfilter), dtype=bool)
+    isfirst[1:] = cellfilter[1:] != cellfilter[:-1]
+    islast = np.roll(isfirst, -1)
+    firstday = cellday[isfirst]
+    lastday = cellday[islast]
+
+    # grid rows by (filter, year)
+    toyear = lambda d: np.asarray(d, dtype='M8[D]').astype('M8[Y]').astype(
+        np.int64) + 1970
+    firstyear, lastyear = toyear(firstday), toyear(lastday)
+    nyears = lastyear - firstyear + 1
+    rowfilter = np.repeat(cellfilter[isfirst], nyears)
+    rowyear = (np.repeat(firstyear, nyears) + np.arange(nyears.sum()) -
+               np.repeat(np.cumsum(nyears) - nyears, nyears))
+    months = (rowyear[:, None] - 1970) * 12 + GRIDMONTHS[None, :]
+    gridday = (months.astype('M8[M]').astype('M8[D]').astype(np.int64) +
+               GRIDDAYS[None, :])
+    gridfilter = np.broadcast_to(rowfilter[:, None], gridday.shape)
+    rowfirst = np.repeat(firstday, nyears)[:, None]
+    rowlast = np.repeat(lastday, nyears)[:, None]
+    isinrange = (gridday >= rowfirst) & (gridday <= rowlast)
+
+    # previous and following day with values, by searchsorted on sortable
+    # (filter, day) positions
+    day0 = cellday.min() if len(cellday) > 0 else 0
+    stride = (cellday.max() - day0 if len(cellday) > 0 else 0) + 2
+    positions = cellfilter.astype(np.int64) * stride + (cellday - day0)
+    query = (gridfilter[isinrange].astype(np.int64) * stride +
+             (gridday[isinrange] - day0))
+    g = gridday[isinrange]
+    previous = np.searchsorted(positions, query, side='right') - 1
+    following = np.searchsorted(positions, query, side='left')
+    isexact = cellday[previous] == g
+
+    limit = np.iinfo(np.int64).max if limit is None else limit
+    if fill_method is None:
+        sampled = np.where(isexact, cellmean[previous], np.nan)
+    elif fill_method == 'ffill':
+        sampled = np.where(g - cellday[previous] <= limit,
+                           cellmean[previous], np.nan)
+    elif fill_method == 'bfill':
+        sampled = np.where(cellday[following] - g <= limit,
+                           cellmean[following], np.nan)
+    else:
+        gap = np.maximum(cellday[following] - cellday[previous], 1)
+        interpolated = (cellmean[previous] +
+                        (cellmean[following] - cellmean[previous]) *
+                        (g - cellday[previous]) / gap)
+        sampled = np.where(g - cellday[previous] <= limit,
+                           interpolated, np.nan)
+        sampled = np.where(isexact, cellmean[previous], sampled)
+
+    values = np.full(gridday.shape, np.nan)
+    values[isinrange] = sampled
+    return {
+        'filter': rowfilter,
+        'year': rowyear,
+        'day': gridday,
+        'isinrange': isinrange,
+        'values': values,
+    }
+
+
+def series_grid(series, fill_method='linear', limit=15):
+    """Sample single series on the 14th and 28th of each month, see
+    sample_grid.
+
+    Parameters
+    ----------
+    series : pd.Series
+        series with datetime index
+    fill_method : str or None
+        see sample_grid
+    limit : int or None
+        see sample_grid
+
+    Returns
+    -------
+    dict
+        sampling grid of series, see sample_grid
+    """
+    series = series.dropna()
+    if not series.index.is_monotonic_increasing:
+        series = series.sort_index()
+    days = np.asarray(series.index, dtype='M8[D]').astype(np.int64)
+    isfirst = np.ones(len(days), dtype=bool)
+    isfirst[1:] = days[1:] != days[:-1]
+    cell = np.cumsum(isfirst) - 1
+    daily = {
+        'filter': np.zeros(isfirst.sum(), dtype=np.int64),
+        'day': days[isfirst],
+        'mean': (np.bincount(cell, weights=np.asarray(series, dtype=float)) /
+                 np.bincount(cell)),
+    }
+    return sample_grid(daily, fill_method=fill_method, limit=limit)
+
+
+def series_yearly(series, fill_method='linear', limit=15):
+    """Classic yearly GHG, GLG and GVG of single series, from the sampling
+    grid on the 14th and 28th of each month.
+
+    Parameters
+    ----------
+    series : pd.Series
+        series with datetime index
+    fill_method : str or None
+        see sample_grid
+    limit : int or None
+        see sample_grid
+
+    Returns
+    -------
+    pd.DataFrame
+        'ghg', 'glg' and 'gvg' by year, indexed by last day of year, from
+        the first to the last year with grid days in range, or with values
+        if fill_method is None
+    """
+    grid = series_grid(series, fill_method=fill_method, limit=limit)
+    high, low, spring = grid_yearly(grid['values'])
+    if fill_method is None:
+        hasvalues = ~np.isnan(grid['values'])
+    else:
+        hasvalues = grid['isinrange']
+    rows = np.flatnonzero(hasvalues.any(axis=1))
+    selected = slice(rows[0], rows[-1] + 1) if len(rows) > 0 else slice(0)
+    years = grid['year'][selected]
+    index = pd.DatetimeIndex((years - 1969).astype('M8[Y]').astype('M8[D]') -
+                             np.timedelta64(1, 'D'))
+    return pd.DataFrame(OrderedDict([
+        ('ghg', high[selected]),
+        ('glg', low[selected]),
+        ('gvg', spring[selected]),
+    ]), index=index)
+
+
+def grid_yearly(values):
+    """Classic yearly GHG, GLG and GVG from (years x 24) sampling grid.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        (years x 24) values on 14th and 28th of each month, may be NaN
+
+    Returns
+    -------
+    tuple of np.ndarray
+        mean of three highest values, mean of three lowest values and mean
+        of spring values by year, NaN if there are no values
+    """
+    isvalid = ~np.isnan(values)
+    nvalid = isvalid.sum(axis=1)
+    nthree = np.minimum(nvalid, 3)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        high = np.partition(np.where(isvalid, values, -np.inf), -3,
+                            axis=1)[:, -3:]
+        high = np.where(np.isfinite(high), high, 0.).sum(axis=1) / nthree
+        low = np.partition(np.where(isvalid, values, np.inf), 2,
+                           axis=1)[:, :3]
+        low = np.where(np.isfinite(low), low, 0.).sum(axis=1) / nthree
+        spring = values[:, GRIDSPRING]
+        springvalid = isvalid[:, GRIDSPRING]
+        spring = (np.where(springvalid, spring, 0.).sum(axis=1) /
+                  springvalid.sum(axis=1))
+    return high, low, spring
+
+
+def panel_gxg(series, tmin=None, tmax=None, fill_method='linear', limit=15,
+              q_high=0.94, q_low=0.06):
+    """GHG, GLG and GVG for all filters in panel series at once, using the
+    classic and the quantile method. Equal to the methods ghg, glg, gvg,
+    q_ghg, q_glg and q_gvg applied to each series.
+
+    Parameters
+    ----------
+    series : pd.Series
+        series with MultiIndex (location, filternr, date_time), e.g. read
+        from a store
+    tmin, tmax : Optional[pd.Timestamp]
+        Time indices to use
+    fill_method : str or None
+        fill method for interpolation to 14th and 28th of the month, see
+        sample_grid
+    limit : int or None
+        Maximum number of timesteps to fill using fill method, use None to
+        fill all
+    q_high, q_low : float, optional
+        quantiles of q_ghg and q_glg
+
+    Returns
+    -------
+    pd.DataFrame
+        ghg, glg, gvg, q_ghg, q_glg and q_gvg by (location, filternr)
+    """
+    days = panel_days(series, tmin=tmin, tmax=tmax)
+    groups = days['groups']
+    ngroups = len(groups)
+
+    # classic: yearly aggregates of values on 14th and 28th
+    grid = sample_grid(days, fill_method=fill_method, limit=limit)
+    yearfilter = grid['filter']
+    high, low, spring = grid_yearly(grid['values'])
+
+    def mean_by_filter(yearly):
+        isvalid = ~np.isnan(yearly)
+        total = np.bincount(yearfilter[isvalid], weights=yearly[isvalid],
+                            minlength=ngroups)
+        count = np.bincount(yearfilter[isvalid], minlength=ngroups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / count
+
+    # quantile: quantiles and spring median of daily medians
+    inspring = is_spring(days['day'])
+    return pd.DataFrame(OrderedDict([
+        ('ghg', mean_by_filter(high)),
+        ('glg', mean_by_filter(low)),
+        ('gvg', mean_by_filter(spring)),
+        ('q_ghg', ragged_quantile(days['filter'], days['median'],
+                                  ngroups, q_high)),
+        ('q_glg', ragged_quantile(days['filter'], days['median'],
+                                  ngroups, q_low)),
+        ('q_gvg', ragged_quantile(days['filter'][inspring],
+                                  days['median'][inspring],
+                                  ngroups, 0.5)),
+    ]), index=groups)
+
+
+# observed and simulated series of a single filter
+
+class SeriesPair(object):
+    """Observed and simulated series of a single filter, with the GxG
+    methods of this module.
+
+    Daily resampled series and yearly values are memoized by (key, tmin,
+    tmax), so all GxG indicators and differences of a filter resample each
+    series only once.
+
+    Parameters
+    ----------
+    observations, simulated : pd.Series
+        series with datetime index
+    """
+    __slots__ = ('observations', 'simulated', '_daily', '_yearly')
+
+    def __init__(self, observations, simulated):
+        self.observations = observations
+        self.simulated = simulated
+        self._daily = {}
+        self._yearly = {}
+
+    @classmethod
+    def from_tables(cls, observed, model, location, filternr):
+        """Pair of a single filter from store tables.
+
+        Parameters
+        ----------
+        observed, model : pd.Series
+            series with MultiIndex (location, filternr, date_time)
+        location : str
+            location of filter
+        filternr : int
+            filter number
+
+        Returns
+        -------
+        SeriesPair
+        """
+        bykey = lambda t: t.xs((location, filternr), level=[0, 1])
+        return cls(bykey(observed), bykey(model))
+
+    @classmethod
+    def from_records(cls, observed, model, location, filternr, period=None):
+        """Pair of a single filter read from store records.
+
+        Parameters
+        ----------
+        observed, model : dict
+            records with 'file' and 'table' of store
+        location : str
+            location of filter
+        filternr : int
+            filter number
+        period : tuple, optional
+            (start, end) to read, inclusive
+
+        Returns
+        -------
+        SeriesPair
+        """
+        read = lambda r: utils.table_from_record(dict(r),
+                                                 period=period,
+                                                 keys=[(location, filternr)],
+                                                 )
+        return cls.from_tables(read(observed), read(model),
+                               location, filternr)
+
+    def bykey(self, key, tmin=None, tmax=None):
+        """Series of key ('observations' or 'simulated') between tmin and
+        tmax, inclusive"""
+        if key == 'observations':
+            series = self.observations
+        elif key == 'simulated':
+            series = self.simulated
+        else:
+            raise ValueError('{key:} is not a valid key'.format(key=key))
+        return series.loc[tmin:tmax]
+
+    def daily(self, key, tmin=None, tmax=None):
+        """memoized daily, see module function daily"""
+        cachekey = key, tmin, tmax
+        if cachekey not in self._daily:
+            self._daily[cachekey] = daily(self, key=key, tmin=tmin, tmax=tmax)
+        return self._daily[cachekey]
+
+    def yearly(self, key, tmin=None, tmax=None, fill_method='linear',
+               limit=15):
+        """memoized yearly, see module function yearly"""
+        cachekey = key, tmin, tmax, fill_method, limit
+        if cachekey not in self._yearly:
+            self._yearly[cachekey] = yearly(self, key=key,
+                                            tmin=tmin, tmax=tmax,
+                                            fill_method=fill_method,
+                                            limit=limit)
+        return self._yearly[cachekey]
+
+    q_ghg = q_ghg
+    q_glg = q_glg
+    q_gvg = q_gvg
+    d_ghg = d_ghg
+    d_glg = d_glg
+    d_gvg = d_gvg
+    gxg = gxg
+    ghg = ghg
+    glg = glg
+    gvg = gvg
+    __inspring__ = __inspring__
@@ -3,37 +3,77 @@
 # Tom van Steijn, Royal HaskoningDHV
 
 # package
-from tsp import utils
-from tsp.config import config
+from tsp import storage, utils
+from tsp.config import config, Loader
 
 # 3rd party
-from matplotlib import pyplot as plt
-from matplotlib import rcParams
-from matplotlib import dates
-from matplotlib import ticker
 import pandas as pd
 
 # std
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from functools import lru_cache
 import argparse
 import logging
 import yaml
 import os
 
-plt.style.use('classic')
-
-rcParams.update({
+# plot style, set on first plot
+RCPARAMS = {
     'font.family': 'arial',
     'font.size': 8,
     'figure.subplot.hspace': 0.1,
     'figure.dpi': 200
-})
-
-LOCATORS = {
-    'y': dates.YearLocator,
-    'm': dates.MonthLocator,
-    'd': dates.DayLocator,
 }
 
+# matplotlib.dates locators by tick frequency, set on first plot
+LOCATORS = {}
+
+
+@lru_cache(maxsize=None)
+def pyplot():
+    """import matplotlib pyplot, set plot style and LOCATORS, on first call
+    only"""
+    from matplotlib import pyplot as plt
+    from matplotlib import rcParams
+    from matplotlib import dates
+    plt.style.use('classic')
+    rcParams.update(RCPARAMS)
+    LOCATORS.update({
+        'y': dates.YearLocator,
+        'm': dates.MonthLocator,
+        'd': dates.DayLocator,
+    })
+    return plt
+
+
+def use_agg():
+    """use non-interactive Agg backend, in main and plot worker processes"""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render(jobs, workers=1):
+    """plot (imagefile, timeseries, attrs, plotkwargs) jobs with the Agg
+    backend. With more than one worker, plots are rendered in a process pool
+    with at most two jobs in flight per worker."""
+    if workers > 1:
+        maxinflight = 2 * workers
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=use_agg) as executor:
+            inflight = deque()
+            for imagefile, timeseries, attrs, plotkwargs in jobs:
+                inflight.append(executor.submit(plot, imagefile, timeseries,
+                                                attrs, **plotkwargs))
+                if len(inflight) >= maxinflight:
+                    inflight.popleft().result()
+            while inflight:
+                inflight.popleft().result()
+    else:
+        use_agg()
+        for imagefile, timeseries, attrs, plotkwargs in jobs:
+            plot(imagefile, timeseries, attrs, **plotkwargs)
+
 
 def get_parser():
     '''get argumentparser and add arguments
@@ -92,6 +132,9 @@ def plot(
     Returns:
         TYPE: Description
     """
+    plt = pyplot()
+    from matplotlib import ticker
+
     if figsize is None:
         fig, ax = plt.subplots()
     else:
@@ -180,12 +223,128 @@ def plot(
     plt.close()
 
 
+def clustered_job(name, timeseries, attrs, metadata, formats, exportfolder,
+                  plotkwargs):
+    """plot job (imagefile, timeseries, attrs, plotkwargs) of all filters of
+    location, None if no filter is included"""
+    # skip if not included
+    included_filters = metadata['included'].xs(name)
+    if not included_filters.any():
+        return None
+
+    # ploting
+    logging.info('plotting {name:}'.format(
+        name=name))
+    timeseries.reset_index(level=[0, ], drop=True, inplace=True)
+    timeseries = timeseries.unstack(0)
+
+    # relabel columns
+    relabeled = []
+    re_attrs = {}
+    for label, filternr in timeseries.columns:
+        layer = metadata['layers'].loc[(name, filternr)]
+        label_attrs = attrs[label].copy()
+        colorsbylayer = label_attrs.pop('colorsbylayer')
+        label_attrs['color'] = colorsbylayer.get(layer, config.COLOR)
+        formatnumber = label_attrs.pop('labelformat')
+        labelformat = formats['label'].get(formatnumber, 1)
+        relabel = labelformat.format(
+            filternr=filternr, label=label, layer=layer,
+            **metadata['labelvars'].loc[(name, filternr)])
+        re_attrs[relabel] = label_attrs
+        relabeled.append(relabel)
+    timeseries.columns = relabeled
+
+    # get area name
+    area = metadata['areas'].loc[name]
+
+    # create file path
+    areafolder = os.path.join(exportfolder, utils.cleaned(area))
+    if not os.path.exists(areafolder):
+        os.mkdir(areafolder)
+    imagefile = os.path.join(areafolder, formats['file'].format(
+        area=utils.cleaned(area),
+        name=name, ))
+
+    # format title
+    title = formats['title'].format(area=area, name=name)
+
+    # format sidetext
+    sidetext = formats['sidetext'].format(**metadata['sidevars'].loc[name])
+
+    # get surface level
+    if metadata['surfacelevels'] is not None:
+        surfacelevel = metadata['surfacelevels'].loc[name]
+    else:
+        surfacelevel = None
+
+    # plot
+    plotkwargs = dict(plotkwargs,
+                      title=title,
+                      sidetext=sidetext,
+                      surfacelevel=surfacelevel,
+                      )
+    return imagefile, timeseries, re_attrs, plotkwargs
+
+
+def single_job(name, filternr, timeseries, attrs, metadata, formats,
+               exportfolder, plotkwargs):
+    """plot job (imagefile, timeseries, attrs, plotkwargs) of single filter,
+    None if the filter is not included"""
+    # skip if not included
+    if not metadata['included'].loc[(name, filternr)]:
+        return None
+
+    # plotting
+    logging.info('plotting {name:} filter {filternr:d}'.format(
+        name=name, filternr=filternr))
+    timeseries.reset_index(level=[0, 1], drop=True, inplace=True)
+
+    # get area name
+    area = metadata['areas'].loc[(name, filternr)]
+
+    # get layer number
+    layer = metadata['layers'].loc[(name, filternr)]
+
+    # create file path
+    areafolder = os.path.join(exportfolder, utils.cleaned(area))
+    if not os.path.exists(areafolder):
+        os.mkdir(areafolder)
+    imagefile = os.path.join(areafolder, formats['file'].format(
+        area=utils.cleaned(area),
+        name=name, filternr=filternr, layer=layer))
+
+    # format title
+    title = formats['title'].format(
+        area=area, name=name, filternr=filternr, layer=layer)
+
+    # format sidetext
+    sidetext = formats['sidetext'].format(
+        **metadata['sidevars'].loc[(name, filternr)])
+
+    # get surface level
+    if metadata['surfacelevels'] is not None:
+        surfacelevel = metadata['surfacelevels'].loc[(name, filternr)]
+    else:
+        surfacelevel = None
+
+    # plot
+    plotkwargs = dict(plotkwargs,
+                      title=title,
+                      sidetext=sidetext,
+                      surfacelevel=surfacelevel,
+                      )
+    return imagefile, timeseries, attrs, plotkwargs
+
+
 def run(**kwargs):
     # unpack input from kwargs
     metadata = kwargs['metadata']
     records = kwargs['records']
     resample_freq = kwargs.get('resample_freq')
     period = kwargs.get('period')
+    locations = kwargs.get('locations')
+    selectareas = kwargs.get('areas')
     xmajortickfrequency = kwargs.get('xmajortickfrequency')
     xminortickfrequency = kwargs.get('xminortickfrequency')
     ylim = kwargs.get('ylim')
@@ -204,6 +363,7 @@ def run(**kwargs):
     plot_surfacelevel = kwargs.get('plot_surfacelevel', True)
     testone = kwargs.get('testone', False)
     clustered = kwargs.get('clustered', False)
+    workers = kwargs.get('workers', 1)
 
     # create export folder if it does not exist
     if not os.path.exists(exportfolder):
@@ -222,7 +382,7 @@ def run(**kwargs):
 
     # read metadata
     logging.info('reading metadata')
-    if metadata['file'].lower().endswith('.h5'):
+    if storage.isstore(metadata['file']):
         md = utils.table_from_record(metadata)
     else:
         index_cols = metadata.pop('index_cols')
@@ -250,6 +410,23 @@ def run(**kwargs):
     # included filters
     included = md.loc[:, metadata.pop('includefield')].astype(bool)
 
+    # select included filters to read by area and location, if given
+    if selectareas is not None:
+        isselected = included & areas.isin([str(a) for a in selectareas])
+        if locations is not None:
+            isselected &= isselected.index.get_level_values(0).isin(
+                locations)
+        if clustered:
+            bylocation = isselected.groupby(level=0).any()
+            selectedlocations = list(bylocation.index[bylocation])
+            keys = None
+        else:
+            selectedlocations = None
+            keys = list(isselected.index[isselected])
+    else:
+        selectedlocations = locations
+        keys = None
+
     if clustered:
         # sidetext variables
         sidevars = pd.DataFrame({
@@ -273,12 +450,6 @@ def run(**kwargs):
             'bottomfilter': bottomfilters,
         })
 
-    # read series and attrs from records
-    logging.info('reading timeseries')
-    ss = {r['label']: utils.table_from_record(r) for r in records}
-    ss = pd.DataFrame(ss)
-    attrs = {r.pop('label'): r for r in records}
-
     # convert period to datetime
     if period is not None:
         start, end = period
@@ -286,6 +457,22 @@ def run(**kwargs):
         end = pd.to_datetime(end)
         period = (start, end)
 
+    # select period on read, unless series are resampled first
+    if resample_freq is None:
+        readperiod = period
+    else:
+        readperiod = None
+
+    # read series and attrs from records
+    logging.info('reading timeseries')
+    ss = {r['label']: utils.table_from_record(r,
+                                              period=readperiod,
+                                              locations=selectedlocations,
+                                              keys=keys)
+          for r in records}
+    ss = pd.DataFrame(ss)
+    attrs = {r.pop('label'): r for r in records}
+
     # resample and/or truncate series
     if (resample_freq is not None) and (period is not None):
         logging.info('resampling and truncating timeseries')
@@ -306,14 +493,6 @@ def run(**kwargs):
               .stack([1, 2])
               .reorder_levels([1, 2, 0])
               .sort_index())
-    elif period is not None:
-        logging.info('truncating timeseries')
-        ss = (ss
-              .unstack(level=[0, 1])
-              .truncate(before=start, after=end)
-              .stack([1, 2])
-              .reorder_levels([1, 2, 0])
-              .sort_index())
 
     if testone:
         if clustered:
@@ -321,129 +500,45 @@ def run(**kwargs):
         else:
             _, ss = next(iter(ss.groupby(level=[0, 1])))
 
+    # metadata, formats and plot arguments shared by all figures
+    figuremetadata = {
+        'included': included,
+        'areas': areas,
+        'layers': layers,
+        'sidevars': sidevars,
+        'labelvars': labelvars if clustered else None,
+        'surfacelevels': surfacelevels if plot_surfacelevel else None,
+    }
+    formats = {
+        'file': fileformat,
+        'title': titleformat,
+        'sidetext': sidetextformat,
+        'label': serieslabelformats,
+    }
+    plotkwargs = dict(
+        figsize=figsize,
+        period=period,
+        xmajortickfrequency=xmajortickfrequency,
+        xminortickfrequency=xminortickfrequency,
+        ylim=ylim,
+        ymargin=ymargin,
+        ymajortickspacing=ymajortickspacing,
+        yminortickspacing=yminortickspacing,
+        xlabel=xlabel,
+        ylabel=ylabel,
+    )
+
+    # plot jobs, constructed one figure at a time
     if clustered:
-        for name, timeseries in ss.groupby(level=[0, ]):
-            # skip if not included
-            included_filters = included.xs(name)
-            if not included_filters.any():
-                continue
-
-            # ploting
-            logging.info('plotting {name:}'.format(
-                name=name))
-            timeseries.reset_index(level=[0, ], drop=True, inplace=True)
-            timeseries = timeseries.unstack(0)
-
-            # relabel columns
-            relabeled = []
-            re_attrs = {}
-            for label, filternr in timeseries.columns:
-                layer = layers.loc[(name, filternr)]
-                label_attrs = attrs[label].copy()
-                colorsbylayer = label_attrs.pop('colorsbylayer')
-                label_attrs['color'] = colorsbylayer.get(layer, config.COLOR)
-                formatnumber = label_attrs.pop('labelformat')
-                labelformat = serieslabelformats.get(formatnumber, 1)
-                relabel = labelformat.format(filternr=filternr, label=label,
-                                             layer=layer, **labelvars.loc[(name, filternr)])
-                re_attrs[relabel] = label_attrs
-                relabeled.append(relabel)
-            timeseries.columns = relabeled
-
-            # get area name
-            area = areas.loc[name]
-
-            # create file path
-            areafolder = os.path.join(exportfolder, utils.cleaned(area))
-            if not os.path.exists(areafolder):
-                os.mkdir(areafolder)
-            imagefile = os.path.join(areafolder, fileformat.format(
-                area=utils.cleaned(area),
-                name=name, ))
-
-            # format title
-            title = titleformat.format(area=area, name=name)
-
-            # format sidetext
-            sidetext = sidetextformat.format(**sidevars.loc[name])
-
-            # get surface level
-            if plot_surfacelevel:
-                surfacelevel = surfacelevels.loc[name]
-            else:
-                surfacelevel = None
-
-            # plot
-            plot(imagefile, timeseries, re_attrs,
-                 figsize=figsize,
-                 period=period,
-                 xmajortickfrequency=xmajortickfrequency,
-                 xminortickfrequency=xminortickfrequency,
-                 ylim=ylim,
-                 ymargin=ymargin,
-                 ymajortickspacing=ymajortickspacing,
-                 yminortickspacing=yminortickspacing,
-                 xlabel=xlabel,
-                 ylabel=ylabel,
-                 title=title,
-                 sidetext=sidetext,
-                 surfacelevel=surfacelevel,
-                 )
+        jobs = (clustered_job(name, timeseries, attrs, figuremetadata,
+                              formats, exportfolder, plotkwargs)
+                for name, timeseries in ss.groupby(level=[0, ]))
     else:
-        for (name, filternr), timeseries in ss.groupby(level=[0, 1]):
-            # skip if not included
-            if not included.loc[(name, filternr)]:
-                continue
-
-            # plotting
-            logging.info('plotting {name:} filter {filternr:d}'.format(
-                name=name, filternr=filternr))
-            timeseries.reset_index(level=[0, 1], drop=True, inplace=True)
-
-            # get area name
-            area = areas.loc[(name, filternr)]
-
-            # get layer number
-            layer = layers.loc[(name, filternr)]
-
-            # create file path
-            areafolder = os.path.join(exportfolder, utils.cleaned(area))
-            if not os.path.exists(areafolder):
-                os.mkdir(areafolder)
-            imagefile = os.path.join(areafolder, fileformat.format(
-                area=utils.cleaned(area),
-                name=name, filternr=filternr, layer=layer))
-
-            # format title
-            title = titleformat.format(
-                area=area, name=name, filternr=filternr, layer=layer)
-
-            # format sidetext
-            sidetext = sidetextformat.format(**sidevars.loc[(name, filternr)])
-
-            # get surface level
-            if plot_surfacelevel:
-                surfacelevel = surfacelevels.loc[(name, filternr)]
-            else:
-                surfacelevel = None
-
-            # plot
-            plot(imagefile, timeseries, attrs,
-                 figsize=figsize,
-                 dpi=dpi,
-                 period=period,
-                 xmajortickfrequency=xmajortickfrequency,
-                 xminortickfrequency=xminortickfrequency,
-                 ylim=ylim,
-                 ymargin=ymargin,
-                 ymajortickspacing=ymajortickspacing,
-                 yminortickspacing=yminortickspacing,
-                 xlabel=xlabel,
-                 ylabel=ylabel,
-                 title=title,
-                 sidetext=sidetext,
-                 surfacelevel=surfacelevel,
-                 )
+        plotkwargs['dpi'] = dpi
+        jobs = (single_job(name, filternr, timeseries, attrs, figuremetadata,
+                           formats, exportfolder, plotkwargs)
+                for (name, filternr), timeseries in ss.groupby(level=[0, 1]))
+    render((job for job in jobs if job is not None), workers=workers)
 
 
 def main(inputfile=None):
@@ -452,7 +547,7 @@ def main(inputfile=None):
         args = get_parser().parse_args()
         inputfile = args.inputfile
     with open(inputfile) as y:
-        kwargs = yaml.load(y)
+        kwargs = yaml.load(y, Loader=Loader)
         kwargs['inputfile'] = inputfile
     run(**kwargs)
 
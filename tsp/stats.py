@@ -3,14 +3,17 @@
 # Tom van Steijn, Royal HaskoningDHV
 
 # package
-from tsp.config import config
-from tsp import utils
+from tsp.config import config, Loader
+from tsp import statscache, storage, utils
+from tsp.utils import (combine_codes, export, exportpath, first_last,
+                       group_ids, split_codes)
 
 # 3rd party
 import pandas as pd
 import numpy as np
 
 # std
+from concurrent.futures import ProcessPoolExecutor
 from collections import OrderedDict
 import argparse
 import logging
@@ -31,24 +34,994 @@ def get_parser():
     return parser
 
 
+# index level names used internally when aligning
+ALIGNLEVELS = ['location', 'filternr', 'date_time']
+
+
+def asof(observed, model, direction='backward', tolerance=None):
+    """model values and their timestamps at index of observed, see align"""
+    if tolerance is not None:
+        tolerance = pd.Timedelta(tolerance)
+
+    # flat frames sorted by time, as required by merge_asof
+    left = observed.index.to_frame(index=False)
+    left.columns = ALIGNLEVELS
+    left['row'] = np.arange(len(left))
+    left = left.sort_values('date_time', kind='mergesort')
+
+    model = model.dropna()
+    right = model.index.to_frame(index=False)
+    right.columns = ALIGNLEVELS
+    right['value'] = np.asarray(model, dtype=float)
+    right['time'] = right['date_time']
+    right = right.sort_values('date_time', kind='mergesort')
+
+    merged = pd.merge_asof(left, right,
+                           on='date_time',
+                           by=ALIGNLEVELS[:2],
+                           direction=direction,
+                           tolerance=tolerance,
+                           )
+
+    # back to order of observed
+    rows = merged['row'].values
+    values = np.empty(len(observed), dtype=float)
+    values[rows] = merged['value'].values
+    times = np.empty(len(observed), dtype='M8[ns]')
+    times[rows] = np.asarray(merged['time'], dtype='M8[ns]')
+    return values, times
+
+
+def align(observed, model, direction='backward', tolerance=None):
+    """Align model to observed timestamps with an as-of join per
+    (location, filternr). Model values never leak between filters.
+
+    Args:
+        observed (Series): observed values with MultiIndex
+            (location, filternr, date_time)
+        model (Series): model values with MultiIndex
+            (location, filternr, date_time)
+        direction (str, optional): 'backward' (last model value at or
+            before), 'forward' (first at or after) or 'nearest'
+        tolerance (str or Timedelta, optional): maximum time between
+            observed and model timestamp, missing if exceeded
+
+    Returns:
+        Series: model values at index of observed
+    """
+    values, _ = asof(observed, model,
+                     direction=direction,
+                     tolerance=tolerance,
+                     )
+    return pd.Series(values, index=observed.index, name=model.name)
+
+
+# columns of aligned rows, see align_rows
+ALIGNCOLUMNS = ['model', 'modeltime', 'other', 'othertime']
+
+
+def align_rows(observed, model, direction='backward', tolerance=None):
+    """Align model to observed like align, keeping the timestamp of each
+    model value. For direction 'nearest' the nearest model value on the
+    other side of the observed timestamp is kept as well, so the alignment
+    can be truncated to periods within the aligned period, see truncate.
+
+    Returns:
+        DataFrame: ALIGNCOLUMNS at index of observed, other values are
+            missing unless direction is 'nearest'
+    """
+    values, times = asof(observed, model,
+                         direction=direction,
+                         tolerance=tolerance,
+                         )
+    others = np.full(len(observed), np.nan)
+    othertimes = np.full(len(observed), np.datetime64('NaT'), dtype='M8[ns]')
+    if direction == 'nearest':
+        backward, backwardtimes = asof(observed, model,
+                                       direction='backward',
+                                       tolerance=tolerance,
+                                       )
+        forward, forwardtimes = asof(observed, model,
+                                     direction='forward',
+                                     tolerance=tolerance,
+                                     )
+        isbackward = times == backwardtimes
+        others = np.where(isbackward, forward, backward)
+        othertimes = np.where(isbackward, forwardtimes, backwardtimes)
+    return pd.DataFrame(OrderedDict([
+        ('model', values),
+        ('modeltime', times),
+        ('other', others),
+        ('othertime', othertimes),
+    ]), index=observed.index)
+
+
+def truncate(aligned, period):
+    """Model values of aligned rows as if the model was selected in period
+    (start, end) before aligning: values from outside the period are
+    replaced by the other value if that is in period, missing otherwise.
+
+    Args:
+        aligned (DataFrame): ALIGNCOLUMNS of rows in period, see align_rows
+        period (tuple): start, end Timestamps, inclusive
+
+    Returns:
+        Series: model values at index of aligned
+    """
+    start, end = (pd.Timestamp(t) for t in period)
+    isoutside = lambda t: (t < start) | (t > end)
+    isinside = lambda t: (t >= start) & (t <= end)
+    values = np.where(isoutside(aligned['modeltime']),
+                      aligned['other'].where(isinside(aligned['othertime'])),
+                      aligned['model'])
+    return pd.Series(values, index=aligned.index)
+
+
+# sufficient statistics of residuals and observed values
+SUMS = [
+    'n',
+    'sum_r',
+    'sum_abs_r',
+    'sum_r2',
+    'nobserved',
+    'sum_observed',
+    'sum_observed2',
+]
+
+
+def terms(observed, residuals):
+    """per row terms of SUMS, missing values as zero"""
+    r = np.asarray(residuals, dtype=float)
+    hasr = ~np.isnan(r)
+    r = np.where(hasr, r, 0.)
+
+    o = np.asarray(observed, dtype=float)
+    haso = ~np.isnan(o)
+    o = np.where(haso, o, 0.)
+
+    return OrderedDict([
+        ('n', hasr.astype(float)),
+        ('sum_r', r),
+        ('sum_abs_r', np.abs(r)),
+        ('sum_r2', r * r),
+        ('nobserved', haso.astype(float)),
+        ('sum_observed', o),
+        ('sum_observed2', o * o),
+    ])
+
+
+def sufficient_statistics(observed, residuals, nlevels=2):
+    """Sufficient statistics of residuals and observed values by group, in
+    one vectorized pass: number and sums of residuals, absolute residuals
+    and squared residuals, and number and sums of observed and squared
+    observed values. Missing values are skipped.
+
+    Args:
+        observed (Series): observed values with MultiIndex
+        residuals (Series): residuals with same index as observed
+        nlevels (int, optional): number of index levels to group by
+
+    Returns:
+        DataFrame: SUMS columns by group
+    """
+    ids, groups = group_ids(residuals.index, nlevels=nlevels)
+    ngroups = len(groups)
+    return pd.DataFrame(OrderedDict(
+        (column, np.bincount(ids, weights=values, minlength=ngroups))
+        for column, values in terms(observed, residuals).items()
+    ), index=groups)
+
+
+def time_positions(index, ids, ngroups, margin=0):
+    """Sortable int64 positions of rows of sorted MultiIndex
+    (location, filternr, date_time): seconds since first row of filter,
+    offset by filter id times stride. Positions of different filters are
+    at least margin + 1 seconds apart.
+
+    Returns:
+        tuple: positions, first second by filter, offset by filter, stride
+    """
+    seconds = np.asarray(index.get_level_values(2),
+                         dtype='M8[s]').astype(np.int64)
+    firstrows = np.searchsorted(ids, np.arange(ngroups))
+    firsts = seconds[firstrows]
+    relative = seconds - firsts[ids]
+    stride = (relative.max() if len(relative) > 0 else 0) + margin + 3
+    offsets = np.arange(ngroups, dtype=np.int64) * stride
+    return offsets[ids] + relative, firsts, offsets, stride
+
+
+def period_sums(observed, aligned, periods):
+    """Sufficient statistics by (period, location, filternr) for named
+    periods. The model values aligned over all periods are truncated to
+    each period, so sums equal those of a run of that period alone.
+
+    Args:
+        observed (Series): observed values with MultiIndex
+            (location, filternr, date_time)
+        aligned (DataFrame): ALIGNCOLUMNS at index of observed, see
+            align_rows
+        periods (OrderedDict): inclusive (start, end) Timestamps by name
+
+    Returns:
+        DataFrame: SUMS columns by (period, location, filternr), filters
+            without rows in period are left out
+    """
+    dates = observed.index.get_level_values(2)
+    parts = []
+    for start, end in periods.values():
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        isinperiod = (dates >= start) & (dates <= end)
+        periodobserved = observed.loc[isinperiod]
+        residuals = (truncate(aligned.loc[isinperiod], (start, end)) -
+                     periodobserved)
+        parts.append(sufficient_statistics(periodobserved, residuals))
+    return pd.concat(parts, axis=0, keys=list(periods), names=['period'])
+
+
+def variance(n, sums, sums2):
+    """sample variance from number, sum and sum of squares"""
+    return ((sums2 - sums ** 2 / n) / (n - 1)).where(n > 1)
+
+
+def statistics(sums):
+    """Residual statistics derived from sufficient statistics.
+
+    Args:
+        sums (DataFrame): SUMS columns by group
+
+    Returns:
+        DataFrame: mean error, mean absolute error, root mean square error,
+            sum of squared errors and explained variance percentage by group
+    """
+    n = sums['n']
+    observedvariance = variance(sums['nobserved'],
+                                sums['sum_observed'],
+                                sums['sum_observed2'])
+    residualvariance = variance(n, sums['sum_r'], sums['sum_r2'])
+    return pd.DataFrame(OrderedDict([
+        ('mean error', sums['sum_r'] / n),
+        ('mean absolute error', sums['sum_abs_r'] / n),
+        ('root mean square error', np.sqrt(sums['sum_r2'] / n)),
+        ('sum of squared errors', sums['sum_r2']),
+        ('explained variance percentage',
+         (observedvariance - residualvariance) / observedvariance * 100.),
+    ]), index=sums.index)
+
+
+def total_statistics(observed, residuals):
+    """residual statistics of all rows of series, see statistics"""
+    totals = OrderedDict((column, [values.sum()])
+                         for column, values in terms(observed,
+                                                     residuals).items())
+    return statistics(pd.DataFrame(totals)).iloc[0]
+
+
 def mean_error(residuals):
-    return residuals.mean()
+    return total_statistics(residuals, residuals)['mean error']
 
 
 def mean_absolute_error(residuals):
-    return residuals.abs().mean()
+    return total_statistics(residuals, residuals)['mean absolute error']
 
 
 def root_mean_square_error(residuals):
-    return np.sqrt(residuals.pow(2).mean())
+    return total_statistics(residuals, residuals)['root mean square error']
 
 
 def sum_of_squared_errors(residuals):
-    return residuals.pow(2).sum()
+    return total_statistics(residuals, residuals)['sum of squared errors']
 
 
 def explained_variance_percentage(observed, residuals):
-    return (observed.var() - residuals.var()) / observed.var() * 100.
+    return total_statistics(observed,
+                            residuals)['explained variance percentage']
+
+
+def rollup_codes(sums, md, columns):
+    """Integer codes of index levels before (location, filternr) and of
+    metadata columns at each row of sums. Metadata is joined at filter
+    level, once for all columns.
+
+    Args:
+        sums (DataFrame): SUMS columns by ([...,] location, filternr)
+        md (DataFrame): metadata with unique (location, filternr) index
+        columns (list): metadata columns
+
+    Returns:
+        OrderedDict: (codes, uniques) by level or column name, code -1 if
+            missing. Leading levels are coded in order of appearance, as
+            in sums, metadata columns in sorted order.
+    """
+    nleading = sums.index.nlevels - 2
+    codes = OrderedDict()
+    for level in range(nleading):
+        codes[sums.index.names[level]] = pd.factorize(
+            sums.index.get_level_values(level))
+    filterkeys = sums.index.droplevel(list(range(nleading)))
+    positions = md.index.get_indexer(filterkeys)
+    for column in columns:
+        columncodes, uniques = pd.factorize(md[column], sort=True)
+        columncodes = np.where(positions >= 0, columncodes[positions], -1)
+        codes[column] = columncodes, uniques
+    return codes
+
+
+def rollup_groups(sums, codes, by):
+    """Group ids of rows of sums by leading index levels and metadata
+    columns.
+
+    Args:
+        sums (DataFrame): SUMS columns by ([...,] location, filternr)
+        codes (OrderedDict): codes by level and column, see rollup_codes
+        by (list): metadata columns to group by
+
+    Returns:
+        tuple: boolean array of rows with metadata, group id of those
+            rows, index of groups
+    """
+    nleading = sums.index.nlevels - 2
+    names = list(sums.index.names[:nleading]) + list(by)
+    keycodes = [codes[name][0] for name in names]
+    uniques = [codes[name][1] for name in names]
+    sizes = [len(u) for u in uniques]
+
+    valid = np.all([c >= 0 for c in keycodes], axis=0)
+    combined = combine_codes([c[valid] for c in keycodes], sizes)
+    ids, groups = pd.factorize(combined, sort=True)
+
+    arrays = [u[c] for u, c in zip(uniques, split_codes(groups, sizes))]
+    if len(arrays) > 1:
+        index = pd.MultiIndex.from_arrays(arrays, names=names)
+    else:
+        index = pd.Index(arrays[0], name=names[0])
+    return valid, ids, index
+
+
+def rollup(sums, codes, by):
+    """Sum sufficient statistics of (location, filternr) groups by
+    metadata columns and count distinct locations and filters. Leading
+    index levels before (location, filternr), e.g. scenario, are kept as
+    groups. Filters with missing metadata are left out.
+
+    Args:
+        sums (DataFrame): SUMS columns by ([...,] location, filternr)
+        codes (OrderedDict): codes by level and column, see rollup_codes
+        by (list): metadata columns to group by
+
+    Returns:
+        DataFrame: SUMS, nlocations and nfilters columns by
+            ([...,] *by), leading levels in the order of sums
+    """
+    valid, ids, index = rollup_groups(sums, codes, by)
+    ngroups = len(index)
+
+    rolled = OrderedDict()
+    for column in SUMS:
+        rolled[column] = np.bincount(ids,
+                                     weights=sums[column].values[valid],
+                                     minlength=ngroups)
+
+    # distinct (group, location) pairs and filters by group
+    nleading = sums.index.nlevels - 2
+    nlocationcodes = len(sums.index.levels[nleading])
+    locationcodes = np.asarray(sums.index.codes[nleading])[valid]
+    pairs = np.unique(ids.astype(np.int64) * nlocationcodes + locationcodes)
+    rolled['nlocations'] = np.bincount(pairs // nlocationcodes,
+                                       minlength=ngroups)
+    rolled['nfilters'] = np.bincount(ids, minlength=ngroups)
+    return pd.DataFrame(rolled, index=index)
+
+
+def rollup_replicates(sums, codes, by, replicates):
+    """sum bootstrap replicates of sums of filters by metadata columns,
+    see rollup"""
+    valid, ids, index = rollup_groups(sums, codes, by)
+    return tuple(
+        pd.DataFrame(r.reindex(sums.index).fillna(0.).values[valid])
+        .groupby(ids).sum().set_axis(index)
+        for r in replicates)
+
+
+def rollup_summary(sums, codes, by, replicates=None, confidence=0.95):
+    """summary statistics of sums rolled up by metadata columns, with
+    bootstrap confidence intervals if replicates are given"""
+    rolled = rollup(sums, codes, by)
+    if replicates is not None:
+        replicates = rollup_replicates(sums, codes, by, replicates)
+    return rollup_statistics(rolled,
+                             replicates=replicates,
+                             confidence=confidence)
+
+
+def rollup_statistics(rolled, replicates=None, confidence=0.95):
+    """residual statistics, counts of locations, filters and residuals
+    from rolled up sufficient statistics, with bootstrap confidence
+    intervals if replicates are given"""
+    summary = statistics(rolled)
+    summary['nlocations'] = rolled['nlocations']
+    summary['nfilters'] = rolled['nfilters']
+    summary['nresiduals'] = rolled['n'].astype(int)
+    if replicates is not None:
+        summary = summary.join(bootstrap_intervals(rolled['n'], *replicates,
+                                                   confidence=confidence))
+    return summary
+
+
+# rolling statistics written as series tables, by short name
+ROLLINGSTATISTICS = OrderedDict([
+    ('me', 'mean error'),
+    ('mae', 'mean absolute error'),
+    ('rmse', 'root mean square error'),
+])
+
+
+def rolling_statistics(residuals, window, min_periods=1):
+    """Moving window residual statistics per (location, filternr), from
+    cumulative sums over the sorted residuals in O(n). Each window is
+    (t - window, t] ending at a residual timestamp t, at second resolution.
+
+    Args:
+        residuals (Series): residuals with sorted MultiIndex
+            (location, filternr, date_time)
+        window (str or Timedelta): window length, e.g. '365D'
+        min_periods (int, optional): minimum number of residuals in window,
+            statistics are missing otherwise
+
+    Returns:
+        DataFrame: mean error, mean absolute error, root mean square error
+            and nresiduals by (location, filternr, date_time)
+    """
+    residuals = residuals.dropna()
+    ids, groups = group_ids(residuals.index)
+    window = int(pd.Timedelta(window).total_seconds())
+
+    # time since first residual of filter, offset by filter so windows
+    # never span filters
+    positions, _, _, _ = time_positions(residuals.index, ids, len(groups),
+                                        margin=window)
+
+    # window bounds and sums from cumulative sums
+    left = np.searchsorted(positions, positions - window, side='right')
+    right = np.arange(1, len(residuals) + 1)
+    r = residuals.values.astype(float)
+
+    def windowsum(values):
+        cumulative = np.concatenate([[0.], np.cumsum(values)])
+        return cumulative[right] - cumulative[left]
+
+    n = right - left
+    isvalid = n >= min_periods
+    mean = lambda values: np.where(isvalid, windowsum(values) / n, np.nan)
+    return pd.DataFrame(OrderedDict([
+        ('mean error', mean(r)),
+        ('mean absolute error', mean(np.abs(r))),
+        ('root mean square error', np.sqrt(np.maximum(mean(r * r), 0.))),
+        ('nresiduals', n),
+    ]), index=residuals.index)
+
+
+def write_rolling(rolled, storefile, modelname,
+                  tableformat=config.ROLLINGTABLEFORMAT):
+    """write rolling statistics as series tables to store, one table per
+    statistic"""
+    for statistic, column in ROLLINGSTATISTICS.items():
+        tablename = tableformat.format(model=modelname, statistic=statistic)
+        logging.info('writing rolling {} to table {}'.format(
+            column, tablename))
+        series = rolled[column].rename(tablename)
+        storage.write(storefile, tablename, series)
+
+
+def bootstrap_blocks(residuals, blocklength):
+    """Arrays describing moving blocks of residuals by filter: each filter
+    of n residuals is covered by ceil(n / l) blocks of length l (the last
+    block shorter), l = min(blocklength, n).
+
+    Args:
+        residuals (Series): residuals with sorted MultiIndex, no missing
+            values
+        blocklength (int): number of consecutive residuals per block
+
+    Returns:
+        dict: cumulative sums of residuals and squared residuals, and by
+            block the first row of its filter, number of possible start
+            rows and length, and the first block by filter
+    """
+    ids, groups = group_ids(residuals.index)
+    counts = np.bincount(ids, minlength=len(groups))
+    firstrows = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    lengths = np.minimum(blocklength, counts)
+    nblocks = -(-counts // lengths)
+
+    # blocks by filter, last block holds the remaining residuals
+    blockfilter = np.repeat(np.arange(len(groups)), nblocks)
+    firstblocks = np.concatenate([[0], np.cumsum(nblocks)[:-1]])
+    blocknr = np.arange(len(blockfilter)) - firstblocks[blockfilter]
+    blocklengths = np.where(
+        blocknr < nblocks[blockfilter] - 1,
+        lengths[blockfilter],
+        counts[blockfilter] - (nblocks[blockfilter] - 1) *
+        lengths[blockfilter])
+
+    r = residuals.values.astype(float)
+    return {
+        'groups': groups,
+        'cumsum_r': np.concatenate([[0.], np.cumsum(r)]),
+        'cumsum_r2': np.concatenate([[0.], np.cumsum(r * r)]),
+        'firstrows': firstrows[blockfilter],
+        'nstarts': (counts - lengths + 1)[blockfilter],
+        'lengths': blocklengths,
+        'firstblocks': firstblocks,
+    }
+
+
+def bootstrap_batch(blocks, seed, size):
+    """Bootstrapped sums of residuals and squared residuals by filter for a
+    batch of replicates, each filter resampled from randomly placed
+    blocks.
+
+    Args:
+        blocks (dict): see bootstrap_blocks
+        seed (SeedSequence or int): seed of batch
+        size (int): number of replicates
+
+    Returns:
+        tuple: arrays (filters x size) of sums of residuals and squared
+            residuals
+    """
+    rng = np.random.default_rng(seed)
+    draws = rng.random((len(blocks['lengths']), size))
+    starts = (blocks['firstrows'][:, None] +
+              (draws * blocks['nstarts'][:, None]).astype(np.int64))
+    ends = starts + blocks['lengths'][:, None]
+    sums = []
+    for key in ('cumsum_r', 'cumsum_r2'):
+        cumulative = blocks[key]
+        blocksums = cumulative[ends] - cumulative[starts]
+        sums.append(np.add.reduceat(blocksums, blocks['firstblocks'],
+                                    axis=0))
+    return tuple(sums)
+
+
+# residual blocks shared by bootstrap workers, set by init_bootstrap
+worker_blocks = None
+
+
+def init_bootstrap(blocks):
+    """set residual blocks in bootstrap worker process"""
+    global worker_blocks
+    worker_blocks = blocks
+
+
+def bootstrap_worker(seed, size):
+    """bootstrap_batch in worker process, using shared residual blocks"""
+    return bootstrap_batch(worker_blocks, seed, size)
+
+
+def block_bootstrap(residuals, nboot=1000, blocklength=30, seed=0,
+                    batchsize=50, workers=1):
+    """Moving block bootstrap of sums of residuals per (location, filternr),
+    respecting autocorrelation within blocks. Replicates are drawn in
+    batches with seeds spawned from seed, so results do not depend on the
+    number of workers.
+
+    Args:
+        residuals (Series): residuals with sorted MultiIndex
+            (location, filternr, date_time)
+        nboot (int, optional): number of replicates
+        blocklength (int, optional): number of consecutive residuals per
+            block
+        seed (int, optional): random seed
+        batchsize (int, optional): number of replicates per batch
+        workers (int, optional): number of worker processes
+
+    Returns:
+        tuple: DataFrames of bootstrapped sums of residuals and squared
+            residuals by (location, filternr), one column per replicate
+    """
+    blocks = bootstrap_blocks(residuals.dropna(), blocklength)
+    sizes = [min(batchsize, nboot - i) for i in range(0, nboot, batchsize)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if (workers > 1) and (len(sizes) > 1):
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=init_bootstrap,
+                                 initargs=(blocks,)) as executor:
+            batches = list(executor.map(bootstrap_worker, seeds, sizes))
+    else:
+        batches = [bootstrap_batch(blocks, s, size)
+                   for s, size in zip(seeds, sizes)]
+    return tuple(
+        pd.DataFrame(np.hstack([batch[i] for batch in batches]),
+                     index=blocks['groups'])
+        for i in range(2))
+
+
+def bootstrap_intervals(n, sum_r, sum_r2, confidence=0.95):
+    """Percentile confidence intervals of mean error and root mean square
+    error from bootstrapped sums.
+
+    Args:
+        n (Series): number of residuals by group
+        sum_r (DataFrame): bootstrapped sums of residuals by group
+        sum_r2 (DataFrame): bootstrapped sums of squared residuals by group
+        confidence (float, optional): confidence level
+
+    Returns:
+        DataFrame: lower and upper bounds by group
+    """
+    percentiles = [50. * (1. - confidence), 50. * (1. + confidence)]
+    n = n.reindex(sum_r.index).values[:, None]
+    intervals = OrderedDict()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for name, replicates in (
+                ('mean error', sum_r.values / n),
+                ('root mean square error', np.sqrt(sum_r2.values / n))):
+            lower, upper = np.percentile(replicates, percentiles, axis=1)
+            intervals['{} ci lower'.format(name)] = lower
+            intervals['{} ci upper'.format(name)] = upper
+    return pd.DataFrame(intervals, index=sum_r.index)
+
+
+def daily_panel(series, rows, day0, ndays, nrows):
+    """Daily mean values of series as (rows x days) array on grid of ndays
+    from day0, missing if there are no values on a day.
+
+    Args:
+        series (Series): values with MultiIndex (location, filternr,
+            date_time), no missing values
+        rows (array): panel row of each value
+        day0 (datetime64[D]): first day of grid
+        ndays (int): number of days of grid
+        nrows (int): number of panel rows
+
+    Returns:
+        array: daily mean values
+    """
+    days = (np.asarray(series.index.get_level_values(2), dtype='M8[D]') -
+            day0).astype(np.int64)
+    isongrid = (days >= 0) & (days < ndays)
+    cells = rows[isongrid] * ndays + days[isongrid]
+    total = np.bincount(cells,
+                        weights=np.asarray(series, dtype=float)[isongrid],
+                        minlength=nrows * ndays)
+    count = np.bincount(cells, minlength=nrows * ndays)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (total / count).reshape(nrows, ndays)
+
+
+def lagged_correlation(x, y, maxlag, minoverlap=30):
+    """Pearson correlation of x and y shifted by lags -maxlag .. maxlag for
+    all rows at once, using FFT cross-correlations of values and masks so
+    each lag only uses pairs where both are present. A positive lag means
+    y follows x.
+
+    Args:
+        x (array): (rows x days) values, missing as NaN
+        y (array): (rows x days) values, missing as NaN
+        maxlag (int): maximum lag in days
+        minoverlap (int, optional): minimum number of pairs at a lag,
+            correlation is missing otherwise
+
+    Returns:
+        array: (rows x 2 * maxlag + 1) correlation by lag
+    """
+    mx = ~np.isnan(x)
+    my = ~np.isnan(y)
+
+    # center rows to reduce cancellation
+    with np.errstate(invalid='ignore'):
+        x = np.where(mx, x - np.nanmean(np.where(mx, x, np.nan), axis=1,
+                                        keepdims=True), 0.)
+        y = np.where(my, y - np.nanmean(np.where(my, y, np.nan), axis=1,
+                                        keepdims=True), 0.)
+
+    # zero padded FFT length without wrap around of lags
+    nfft = 1 << int(np.ceil(np.log2(x.shape[1] + maxlag)))
+    transform = lambda a: np.fft.rfft(a, nfft, axis=1)
+    lags = np.arange(-maxlag, maxlag + 1) % nfft
+    correlate = lambda a, b: np.fft.irfft(np.conj(a) * b, nfft,
+                                          axis=1)[:, lags]
+
+    fmx, fmy = transform(mx.astype(float)), transform(my.astype(float))
+    fx, fy = transform(x), transform(y)
+    n = np.round(correlate(fmx, fmy))
+    sx = correlate(fx, fmy)
+    sy = correlate(fmx, fy)
+    sxy = correlate(fx, fy)
+    sxx = correlate(transform(x * x), fmy)
+    syy = correlate(fmx, transform(y * y))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = n * sxy - sx * sy
+        varx = n * sxx - sx * sx
+        vary = n * syy - sy * sy
+        r = covariance / np.sqrt(varx * vary)
+    r[(n < minoverlap) | ~(varx > 0) | ~(vary > 0)] = np.nan
+    return np.clip(r, -1., 1.)
+
+
+def lag_analysis(observed, model, maxlag=90, minoverlap=30, batchsize=256):
+    """Lag between model and observed series per (location, filternr).
+    Both series are resampled to daily means on a grid shared by a batch
+    of filters, correlations at all lags are calculated with FFT.
+
+    Args:
+        observed (Series): observed values with sorted MultiIndex
+            (location, filternr, date_time)
+        model (Series): model values with sorted MultiIndex
+            (location, filternr, date_time)
+        maxlag (int, optional): maximum lag in days
+        minoverlap (int, optional): minimum number of daily pairs at a lag
+        batchsize (int, optional): number of filters per batch
+
+    Returns:
+        DataFrame: best lag in days (positive if model follows observed),
+            peak correlation and correlation at zero lag by
+            (location, filternr)
+    """
+    observed = observed.dropna()
+    model = model.dropna()
+    ids, groups = group_ids(observed.index)
+    modelrows = groups.get_indexer(model.index.droplevel(2))
+    model = model.loc[modelrows >= 0]
+    modelrows = modelrows[modelrows >= 0]
+    observeddays = np.asarray(observed.index.get_level_values(2),
+                              dtype='M8[D]')
+
+    bestlag = np.full(len(groups), np.nan)
+    peak = np.full(len(groups), np.nan)
+    zerolag = np.full(len(groups), np.nan)
+    for first in range(0, len(groups), batchsize):
+        last = min(first + batchsize, len(groups))
+        o0, o1 = np.searchsorted(ids, [first, last])
+        m0, m1 = np.searchsorted(modelrows, [first, last])
+        if not m1 > m0:
+            continue
+
+        # daily grid of batch, extended by maxlag on both sides
+        day0 = observeddays[o0:o1].min() - np.timedelta64(maxlag, 'D')
+        ndays = int((observeddays[o0:o1].max() - day0) /
+                    np.timedelta64(1, 'D')) + maxlag + 1
+        x = daily_panel(observed.iloc[o0:o1], ids[o0:o1] - first,
+                        day0, ndays, last - first)
+        y = daily_panel(model.iloc[m0:m1], modelrows[m0:m1] - first,
+                        day0, ndays, last - first)
+
+        r = lagged_correlation(x, y, maxlag, minoverlap=minoverlap)
+        hasr = ~np.all(np.isnan(r), axis=1)
+        best = np.argmax(np.where(np.isnan(r), -np.inf, r), axis=1)
+        bestlag[first:last] = np.where(hasr, best - maxlag, np.nan)
+        peak[first:last] = np.where(hasr, r[np.arange(len(r)), best],
+                                    np.nan)
+        zerolag[first:last] = r[:, maxlag]
+
+    return pd.DataFrame(OrderedDict([
+        ('best lag', bestlag),
+        ('peak correlation', peak),
+        ('zero lag correlation', zerolag),
+    ]), index=groups)
+
+
+def scenario_sums(observed, model, period=None, locations=None, keys=None,
+                  align_direction='backward', align_tolerance=None,
+                  exportfolder=None, seriesfileformat=None, rolling=None,
+                  exportformat='csv', periods=None, bootstrap=None,
+                  bootstrapworkers=1, lags=None):
+    """Read model series of single scenario, align to observed and
+    calculate sufficient statistics of residuals.
+
+    Args:
+        observed (Series): observed values, read from record
+        model (dict): model record
+        period (tuple, optional): start, end Timestamps
+        locations (list, optional): selected locations
+        keys (list, optional): selected (location, filternr) keys
+        align_direction (str, optional): see align
+        align_tolerance (str, optional): see align
+        exportfolder (str, optional): folder to export series to
+        seriesfileformat (str, optional): series file format, series are
+            exported if given
+        rolling (dict, optional): window and min_periods of rolling
+            statistics
+        exportformat (str, optional): series export format, see export
+        periods (OrderedDict, optional): named periods within period, sums
+            are calculated by (period, location, filternr) if given, each
+            period as if it was run alone
+        bootstrap (dict, optional): block_bootstrap keyword arguments
+        bootstrapworkers (int, optional): number of bootstrap workers
+        lags (dict, optional): lag_analysis keyword arguments
+
+    Returns:
+        tuple: model name, sums by (location, filternr), (start, end),
+            dict of rolling statistics, bootstrap replicates and lags if
+            any
+    """
+    # read series and attrs from record, selecting period and filters
+    logging.info('reading model timeseries {}'.format(model.get('name')))
+    model = utils.table_from_record(dict(model),
+                                    period=period,
+                                    locations=locations,
+                                    keys=keys)
+
+    # drop missing values in period, as before truncating by stacking
+    if period is not None:
+        model = model.dropna()
+        start, end = period
+    else:
+        start, end = first_last(observed, model)
+
+    # calculate residuals of model aligned to observed, named periods are
+    # aligned at once and truncated to each period later
+    logging.info('calculating residuals {}'.format(model.name))
+    alignkwargs = {
+        'direction': align_direction,
+        'tolerance': align_tolerance,
+    }
+    if periods is not None:
+        aligned = align_rows(observed, model, **alignkwargs)
+        residuals = aligned['model'] - observed
+    else:
+        residuals = align(observed, model, **alignkwargs) - observed
+    residuals.name = 'r_{}'.format(model.name)
+
+    if seriesfileformat is not None:
+        # join observed, model and residuals and export
+        seriesfile = exportpath(os.path.join(exportfolder,
+                                             seriesfileformat.format(
+                                                 observed=observed.name,
+                                                 model=model.name,
+                                                 start=start.strftime(
+                                                     '%Y%m%d%H%M%S'),
+                                                 end=end.strftime(
+                                                     '%Y%m%d%H%M%S'),
+                                             )), exportformat)
+        series = pd.concat([observed, model, residuals], axis=1)
+        logging.info('exporting series to {}'.format(
+            os.path.basename(seriesfile)))
+        export(series, seriesfile, exportformat, key='series')
+
+    # sufficient statistics by ([period,] location, filternr)
+    if periods is not None:
+        sums = period_sums(observed, aligned, periods)
+    else:
+        sums = sufficient_statistics(observed, residuals)
+
+    extras = OrderedDict()
+
+    # moving window statistics
+    if rolling is not None:
+        logging.info('calculating rolling statistics {}'.format(model.name))
+        extras['rolling'] = rolling_statistics(
+            residuals,
+            window=rolling['window'],
+            min_periods=rolling.get('min_periods', 1),
+        )
+
+    # bootstrap replicates of sums of residuals
+    if bootstrap is not None:
+        logging.info('bootstrapping residuals {}'.format(model.name))
+        extras['bootstrap'] = block_bootstrap(residuals,
+                                              workers=bootstrapworkers,
+                                              **bootstrap)
+
+    # lag between model and observed
+    if lags is not None:
+        logging.info('calculating lags {}'.format(model.name))
+        extras['lags'] = lag_analysis(observed, model, **lags)
+    return model.name, sums, (start, end), extras
+
+
+def block_sums(observed, residuals, freq):
+    """sufficient statistics by (location, filternr, block), blocks are
+    years or months"""
+    index = pd.MultiIndex.from_arrays([
+        observed.index.get_level_values(0),
+        observed.index.get_level_values(1),
+        statscache.block_starts(observed.index.get_level_values(2), freq),
+    ], names=statscache.BLOCKLEVELS)
+    return sufficient_statistics(observed.set_axis(index),
+                                 residuals.set_axis(index),
+                                 nlevels=3)
+
+
+def cached_scenario_sums(observed, model, period=None, locations=None,
+                         keys=None, align_direction='backward',
+                         align_tolerance=None, freq='year'):
+    """Sufficient statistics of residuals of single scenario from cache of
+    yearly or monthly block sums. The cache is (re)built from the full
+    observed and model series if it is missing or the stores changed.
+    Whole blocks in period are summed, partial blocks at the edges of the
+    period are calculated from the cached aligned rows. Rows aligned to a
+    model value outside the period are corrected, so results equal those
+    of scenario_sums, which selects the model in period before aligning.
+
+    Args:
+        observed (dict): observed record
+        model (dict): model record
+        period (tuple, optional): start, end Timestamps
+        locations (list, optional): selected locations
+        keys (list, optional): selected (location, filternr) keys
+        align_direction (str, optional): see align
+        align_tolerance (str, optional): see align
+        freq (str, optional): cache blocks, 'year' or 'month'
+
+    Returns:
+        tuple: model name, sums by (location, filternr), (start, end),
+            empty dict
+    """
+    cachefile = statscache.cachefile(observed, model)
+    signature = statscache.signature(observed, model,
+                                     freq=freq,
+                                     align_direction=align_direction,
+                                     align_tolerance=align_tolerance,
+                                     )
+    if not statscache.isvalid(cachefile, signature):
+        logging.info('building statistics cache {}'.format(
+            os.path.basename(cachefile)))
+        observedseries = utils.table_from_record(dict(observed))
+        modelseries = utils.table_from_record(dict(model))
+        aligned = align_rows(observedseries, modelseries,
+                             direction=align_direction,
+                             tolerance=align_tolerance,
+                             )
+        rows = pd.concat([observedseries.rename('observed'), aligned],
+                         axis=1)
+        rows.index = rows.index.set_names(statscache.ROWLEVELS)
+        blocks = block_sums(rows['observed'],
+                            rows['model'] - rows['observed'], freq)
+        statscache.write(cachefile, signature, blocks, rows,
+                         extent=first_last(observedseries, modelseries))
+
+    # residuals of rows as if model was selected in period
+    residuals = lambda rows: truncate(rows, period) - rows['observed']
+
+    # whole blocks from cache, edges from aligned rows
+    blockperiod, edges = statscache.split_period(period, freq)
+    parts = []
+    if blockperiod is not None:
+        blocks = statscache.read_blocks(cachefile, blockperiod,
+                                        locations=locations,
+                                        keys=keys,
+                                        )
+        parts.append(blocks.groupby(level=[0, 1]).sum())
+    if (period is not None) and (blockperiod is not None):
+        # replace sums of rows in whole blocks aligned outside period
+        rows = statscache.read_outside(cachefile, blockperiod, period,
+                                       locations=locations,
+                                       keys=keys,
+                                       )
+        parts.append(sufficient_statistics(rows['observed'],
+                                           residuals(rows)))
+        parts.append(-sufficient_statistics(
+            rows['observed'], rows['model'] - rows['observed']))
+    for edge in edges:
+        rows = statscache.read_rows(cachefile, edge,
+                                    locations=locations,
+                                    keys=keys,
+                                    )
+        parts.append(sufficient_statistics(rows['observed'],
+                                           residuals(rows)))
+    sums = pd.concat(parts, axis=0).groupby(level=[0, 1]).sum()
+
+    if period is None:
+        period = statscache.read_extent(cachefile)
+    return model['name'], sums, period, OrderedDict()
+
+
+# observed series shared by scenario workers, set by init_worker
+worker_observed = None
+
+
+def init_worker(observed):
+    """set observed series in scenario worker process"""
+    global worker_observed
+    worker_observed = observed
+
+
+def scenario_worker(model, kwargs):
+    """scenario_sums in worker process, using shared observed series"""
+    return scenario_sums(worker_observed, model, **kwargs)
 
 
 def run(**kwargs):
@@ -57,7 +1030,22 @@ def run(**kwargs):
     observed = kwargs['observed']
     model = kwargs.get('model')
     period = kwargs.get('period')
+    locations = kwargs.get('locations')
+    selectareas = kwargs.get('areas')
     export_series = kwargs.get('export_series', False)
+    align_direction = kwargs.get('align_direction',
+                                 config.STATS_ALIGN_DIRECTION)
+    align_tolerance = kwargs.get('align_tolerance',
+                                 config.STATS_ALIGN_TOLERANCE)
+    scenariosname = kwargs.get('scenariosname', config.STATS_SCENARIOSNAME)
+    workers = kwargs.get('workers', 1)
+    rollups = kwargs.get('rollups', [])
+    cache = kwargs.get('statscache', False)
+    rolling = kwargs.get('rolling')
+    bootstrap = kwargs.get('bootstrap')
+    lags = kwargs.get('lags')
+    exportformat = kwargs.get('exportformat', config.STATS_EXPORTFORMAT)
+    cachefreq = kwargs.get('statscache_freq', config.STATSCACHE_FREQ)
     exportfolder = kwargs['exportfolder']
     seriesfileformat = kwargs.get('seriesfileformat',
                                   config.SERIESFILEFORMAT)
@@ -65,6 +1053,8 @@ def run(**kwargs):
                                    config.SUMMARYFILEFORMAT)
     summarybylayerfileformat = kwargs.get('summarybylayerfileformat',
                                           config.SUMMARYBYLAYERFILEFORMAT)
+    summarybyfileformat = kwargs.get('summarybyfileformat',
+                                     config.SUMMARYBYFILEFORMAT)
 
     # create export folder if it does not exist
     if not os.path.exists(exportfolder):
@@ -72,130 +1062,256 @@ def run(**kwargs):
 
     # read metadata
     logging.info('reading metadata')
-    metadatafile = metadata.pop('file')
-    if metadatafile.lower().endswith('.h5'):
-        with pd.HDFStore(metadata.pop('file')) as s:
-            md = s[metadata.pop('table')]
+    if storage.isstore(metadata['file']):
+        md = utils.table_from_record(metadata)
     else:
         index_cols = metadata.pop('index_cols')
-        md = utils.read_table(metadatafile, index_cols=index_cols)
+        md = utils.read_table(metadata.pop('file'), index_cols=index_cols)
 
     md = md.groupby(level=[0, 1]).last()
 
     areas = md.loc[:, metadata.pop('areafield')].astype(str)
-    layers = md.loc[:, metadata.pop('layerfield')]
-
-    # read series and attrs from records
-    logging.info('reading observed timeseries')
-    observed = utils.table_from_record(observed)
+    layerfield = metadata.pop('layerfield')
 
-    # read series and attrs from records
-    logging.info('reading model timeseries')
-    model = utils.table_from_record(model)
+    # select filters by area
+    if selectareas is not None:
+        keys = areas.index[areas.isin([str(a) for a in selectareas])]
+    else:
+        keys = None
 
-    # convert period to datetime
+    # convert period or named periods to datetime, named periods are read
+    # as one period covering all
+    if isinstance(period, dict):
+        periods = OrderedDict(
+            (name, (pd.to_datetime(start), pd.to_datetime(end)))
+            for name, (start, end) in period.items())
+        period = (min(start for start, _ in periods.values()),
+                  max(end for _, end in periods.values()))
+    else:
+        periods = None
     if period is not None:
         start, end = period
         start = pd.to_datetime(start)
         end = pd.to_datetime(end)
+        period = (start, end)
+
+    # bootstrap options, defaults from config
+    confidence = config.STATS_BOOTSTRAP_CONFIDENCE
+    if bootstrap is not None:
+        if bootstrap is True:
+            bootstrap = {}
+        confidence = bootstrap.get('confidence', confidence)
+        bootstrap = {
+            'nboot': bootstrap.get('nboot', config.STATS_BOOTSTRAP_NBOOT),
+            'blocklength': bootstrap.get('blocklength',
+                                         config.STATS_BOOTSTRAP_BLOCKLENGTH),
+            'seed': bootstrap.get('seed', config.STATS_BOOTSTRAP_SEED),
+            'batchsize': bootstrap.get('batchsize',
+                                       config.STATS_BOOTSTRAP_BATCHSIZE),
+        }
+        if periods is not None:
+            logging.warning('bootstrap intervals are not calculated '
+                            'for named periods')
+            bootstrap = None
+
+    # lag analysis options, defaults from config
+    if lags is not None:
+        if lags is True:
+            lags = {}
+        lags = {
+            'maxlag': lags.get('maxlag', config.STATS_LAG_MAXLAG),
+            'minoverlap': lags.get('minoverlap', config.STATS_LAG_MINOVERLAP),
+            'batchsize': lags.get('batchsize', config.STATS_LAG_BATCHSIZE),
+        }
+        if periods is not None:
+            logging.warning('lags are not calculated for named periods')
+            lags = None
+
+    # sufficient statistics by scenario
+    isbatch = isinstance(model, (list, tuple))
+    models = list(model) if isbatch else [model]
+    if cache:
+        # from cache of block sums next to model stores
+        if export_series:
+            logging.warning('series are not exported using statscache')
+        if rolling is not None:
+            logging.warning('rolling statistics are not calculated '
+                            'using statscache')
+        if bootstrap is not None:
+            logging.warning('bootstrap intervals are not calculated '
+                            'using statscache')
+            bootstrap = None
+        if lags is not None:
+            logging.warning('lags are not calculated using statscache')
+            lags = None
+        observedname = observed['name']
+        cachedkwargs = {
+            'locations': locations,
+            'keys': keys,
+            'align_direction': align_direction,
+            'align_tolerance': align_tolerance,
+            'freq': cachefreq,
+        }
+        results = []
+        for m in models:
+            if periods is None:
+                results.append(cached_scenario_sums(observed, m,
+                                                    period=period,
+                                                    **cachedkwargs))
+                continue
+            periodsums = [cached_scenario_sums(observed, m,
+                                               period=p,
+                                               **cachedkwargs)[1]
+                          for p in periods.values()]
+            results.append((m['name'],
+                            pd.concat(periodsums, axis=0,
+                                      keys=list(periods), names=['period']),
+                            period, OrderedDict()))
+    else:
+        # read series and attrs from records, selecting period and filters
+        logging.info('reading observed timeseries')
+        observed = utils.table_from_record(observed,
+                                           period=period,
+                                           locations=locations,
+                                           keys=keys)
         observedname = observed.name
-        observed = (observed
-                    .unstack(level=[0, 1])
-                    .truncate(before=start, after=end)
-                    .stack([0, 1])
-                    .reorder_levels([1, 2, 0])
-                    .sort_index())
-        observed.name = observedname
-        modelname = model.name
-        model = (model
-                 .unstack(level=[0, 1])
-                 .truncate(before=start, after=end)
-                 .stack([0, 1])
-                 .reorder_levels([1, 2, 0])
-                 .sort_index())
-        model.name = modelname
-
-    # calculate residuals
-    logging.info('calculating residuals')
-    residuals = model.reindex_like(observed, method='ffill') - observed
-    residuals.name = 'r_{}'.format(model.name)
 
-    # join observed, model and residuals
-    series = pd.concat([observed, model, residuals], axis=1)
+        # drop missing values in period, as before truncating by stacking
+        if period is not None:
+            observed = observed.dropna()
 
-    # get start, end from index if not given
-    if period is None:
-        start = series.index[0][2]
-        end = series.index[-1][2]
-
-    # export series to CSV
-    seriesfile = os.path.join(exportfolder, seriesfileformat.format(
-        observed=observed.name,
-        model=model.name,
-        start=start.strftime('%Y%m%d%H%M%S'),
-        end=end.strftime('%Y%m%d%H%M%S'),
-    ))
-
-    if export_series:
-        logging.info('exporting series to {}'.format(
-            os.path.basename(seriesfile)))
-        series.to_csv(seriesfile)
+        # observed is read only once for all scenarios
+        scenariokwargs = {
+            'period': period,
+            'locations': locations,
+            'keys': keys,
+            'align_direction': align_direction,
+            'align_tolerance': align_tolerance,
+            'exportfolder': exportfolder,
+            'seriesfileformat': seriesfileformat if export_series else None,
+            'rolling': rolling,
+            'exportformat': exportformat,
+            'periods': periods,
+            'bootstrap': bootstrap,
+            'bootstrapworkers': workers if len(models) == 1 else 1,
+            'lags': lags,
+        }
+        if (workers > 1) and (len(models) > 1):
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=init_worker,
+                                     initargs=(observed,)) as executor:
+                results = list(executor.map(scenario_worker, models,
+                                            [scenariokwargs] * len(models)))
+        else:
+            results = [scenario_sums(observed, m, **scenariokwargs)
+                       for m in models]
+
+    if isbatch:
+        # long table keyed by scenario
+        logging.info('calculating statistics of {:d} scenarios'.format(
+            len(results)))
+        names = [name for name, _, _, _ in results]
+        sums = pd.concat([s for _, s, _, _ in results],
+                         keys=names, names=['scenario'])
+        modelname = scenariosname
+        start = min(p[0] for _, _, p, _ in results)
+        end = max(p[1] for _, _, p, _ in results)
+    else:
+        logging.info('calculating statistics')
+        modelname, sums, (start, end), _ = results[0]
+
+    # write rolling statistics as series tables for plotting
+    for name, _, _, extras in results:
+        if 'rolling' in extras:
+            write_rolling(extras['rolling'], rolling['file'], name)
+
+    # bootstrap replicates of sums, keyed like sums
+    if bootstrap is not None:
+        replicates = [extras['bootstrap'] for _, _, _, extras in results]
+        if isbatch:
+            replicates = tuple(
+                pd.concat([r[i] for r in replicates],
+                          keys=names, names=['scenario'])
+                for i in range(2))
+        else:
+            replicates = replicates[0]
+        replicates = tuple(r.reindex(sums.index).fillna(0.)
+                           for r in replicates)
+    else:
+        replicates = None
 
     # summary statistics
-    statfuncs = OrderedDict([
-        ('mean error', mean_error),
-        ('mean absolute error', mean_absolute_error),
-        ('root mean square error', root_mean_square_error),
-    ])
-    summary = residuals.groupby(level=[0, 1]).aggregate(statfuncs)
-
-    evp = lambda s: explained_variance_percentage(s[observed.name],
-                                                  s[residuals.name])
-    summary['explained variance percentage'] = (series
-                                                .groupby(level=(0, 1))
-                                                .apply(evp))
-    summary['nresiduals'] = residuals.groupby(level=[0, 1]).count()
-
-    summaryfile = os.path.join(exportfolder, summaryfileformat.format(
-        observed=observed.name,
-        model=model.name,
-        start=start.strftime('%Y%m%d%H%M%S'),
-        end=end.strftime('%Y%m%d%H%M%S'),
-    ))
-
-    # export summary to CSV
+    summary = statistics(sums)
+    summary['nresiduals'] = sums['n'].astype(int)
+    if replicates is not None:
+        summary = summary.join(bootstrap_intervals(sums['n'], *replicates,
+                                                   confidence=confidence))
+
+    # lag columns
+    if lags is not None:
+        lagtables = [extras['lags'] for _, _, _, extras in results]
+        if isbatch:
+            lagtables = pd.concat(lagtables, keys=names, names=['scenario'])
+        else:
+            lagtables = lagtables[0]
+        summary = summary.join(lagtables)
+
+    summaryfile = exportpath(os.path.join(exportfolder,
+                                          summaryfileformat.format(
+                                              observed=observedname,
+                                              model=modelname,
+                                              start=start.strftime(
+                                                  '%Y%m%d%H%M%S'),
+                                              end=end.strftime(
+                                                  '%Y%m%d%H%M%S'),
+                                          )), exportformat)
+
+    # export summary
     logging.info('exporting summary statistics to {}'.format(
         os.path.basename(summaryfile)))
-    summary.to_csv(summaryfile)
-
-    # summary by layer
-    layers = layers.reindex_like(residuals, method='ffill')
-    summarybylayer = residuals.groupby(layers).aggregate(statfuncs)
-
-    evp = lambda s: explained_variance_percentage(s[observed.name],
-                                                  s[residuals.name])
-    summarybylayer['explained variance percentage'] = (series
-                                                       .groupby(layers)
-                                                       .apply(evp))
-
-    summarybylayer['nlocations'] = (residuals.groupby(layers)
-                                    .apply(lambda s: len(s.groupby(level=0))))
-    summarybylayer['nfilters'] = (residuals.groupby(layers)
-                                  .apply(lambda s: len(s.groupby(level=[0, 1]))))
-    summarybylayer['nresiduals'] = residuals.groupby(layers).count()
-
-    summarybylayerfile = os.path.join(exportfolder,
-                                      summarybylayerfileformat.format(
-                                          observed=observed.name,
-                                          model=model.name,
-                                          start=start.strftime('%Y%m%d%H%M%S'),
-                                          end=end.strftime('%Y%m%d%H%M%S'),
-                                      ))
-
-    # export summary by layer to CSV
+    export(summary, summaryfile, exportformat, key='summary')
+
+    # join metadata at filter level as integer codes
+    groupings = [[layerfield]]
+    for by in rollups:
+        groupings.append([by] if isinstance(by, str) else list(by))
+    columns = list(OrderedDict.fromkeys(c for by in groupings for c in by))
+    codes = rollup_codes(sums, md, columns)
+
+    # summary by layer, summing sufficient statistics of filters
+    summarybylayer = rollup_summary(sums, codes, [layerfield],
+                                    replicates=replicates,
+                                    confidence=confidence)
+
+    summarybylayerfile = exportpath(os.path.join(
+        exportfolder, summarybylayerfileformat.format(
+            observed=observedname,
+            model=modelname,
+            start=start.strftime('%Y%m%d%H%M%S'),
+            end=end.strftime('%Y%m%d%H%M%S'),
+        )), exportformat)
+
+    # export summary by layer
     logging.info('exporting by layer statistics to {}'.format(
         os.path.basename(summarybylayerfile)))
-    summarybylayer.to_csv(summarybylayerfile)
+    export(summarybylayer, summarybylayerfile, exportformat, key='summary')
+
+    # summaries by other metadata columns and combinations of columns
+    for by in groupings[1:]:
+        summaryby = rollup_summary(sums, codes, by,
+                                   replicates=replicates,
+                                   confidence=confidence)
+        summarybyfile = exportpath(os.path.join(
+            exportfolder, summarybyfileformat.format(
+                by='_'.join(by),
+                observed=observedname,
+                model=modelname,
+                start=start.strftime('%Y%m%d%H%M%S'),
+                end=end.strftime('%Y%m%d%H%M%S'),
+            )), exportformat)
+        logging.info('exporting by {} statistics to {}'.format(
+            ' x '.join(by), os.path.basename(summarybyfile)))
+        export(summaryby, summarybyfile, exportformat, key='summary')
 
 
 def main(inputfile=None):
@@ -204,7 +1320,7 @@ def main(inputfile=None):
         args = get_parser().parse_args()
         inputfile = args.inputfile
     with open(inputfile) as y:
-        kwargs = yaml.load(y)
+        kwargs = yaml.load(y, Loader=Loader)
         kwargs['inputfile'] = inputfile
     run(**kwargs)
 
@@ -0,0 +1,179 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp.config import config
+from tsp import storage
+
+# 3rd party
+import pandas as pd
+import numpy as np
+
+# std
+from collections import OrderedDict
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+# numpy datetime unit of cache blocks
+FREQUNITS = {
+    'year': 'Y',
+    'month': 'M',
+}
+
+BLOCKLEVELS = ['location', 'filternr', 'block']
+ROWLEVELS = ['location', 'filternr', 'date_time']
+
+BLOCKSKEY = 'blocks'
+ROWSKEY = 'rows'
+EXTENTKEY = 'extent'
+SIGNATUREKEY = 'signature'
+
+# layout of cache, part of signature so caches of older layouts are rebuilt
+VERSION = 2
+
+
+def cachefile(observed, model,
+              cachefileformat=config.STATSCACHEFILEFORMAT):
+    """path of statistics cache of observed and model records, next to the
+    model store"""
+    folder = os.path.dirname(os.path.abspath(model['file']))
+    return os.path.join(folder, cachefileformat.format(
+        observed=observed['name'],
+        model=model['name'],
+    ))
+
+
+def signature(observed, model, freq, align_direction, align_tolerance):
+    """Series identifying source tables, their modification times and
+    options of cache"""
+    source = lambda r: '{file:}::{table:}'.format(
+        file=os.path.abspath(r['file']), table=r.get('table', 'series'))
+    mtime = lambda r: repr(storage.modified(r['file'],
+                                            r.get('table', 'series')))
+    return pd.Series(OrderedDict([
+        ('version', str(VERSION)),
+        ('observed', source(observed)),
+        ('observedmtime', mtime(observed)),
+        ('model', source(model)),
+        ('modelmtime', mtime(model)),
+        ('freq', str(freq)),
+        ('align_direction', str(align_direction)),
+        ('align_tolerance', str(align_tolerance)),
+    ]))
+
+
+def isvalid(path, signature):
+    """True if cache exists and was built from unchanged sources with the
+    same options"""
+    if not os.path.exists(path):
+        return False
+    with pd.HDFStore(path, 'r') as store:
+        if SIGNATUREKEY not in store:
+            return False
+        previous = store[SIGNATUREKEY]
+    return previous.equals(signature)
+
+
+def write(path, signature, blocks, rows, extent):
+    """Write cache of block sums, aligned rows and extent (start, end). The
+    signature is written last, so an interrupted write leaves an invalid
+    cache. Rows without model value get their own timestamp as model
+    timestamp, so only rows aligned to a model value are queried by
+    read_outside."""
+    if os.path.exists(path):
+        os.remove(path)
+    storage.write(path, BLOCKSKEY, blocks, hdf5format='table')
+    rows = rows.copy()
+    rows['modeltime'] = rows['modeltime'].fillna(
+        pd.Series(rows.index.get_level_values(2), index=rows.index))
+    with pd.HDFStore(path) as store:
+        store.put(ROWSKEY, rows,
+                  format='table',
+                  data_columns=['modeltime'],
+                  min_itemsize={ROWLEVELS[0]:
+                                config.STORE_LOCATION_ITEMSIZE},
+                  )
+        store.put(EXTENTKEY, pd.Series(list(extent), index=['start', 'end']))
+        store.put(SIGNATUREKEY, signature)
+
+
+def read_extent(path):
+    """start, end of cached series"""
+    with pd.HDFStore(path, 'r') as store:
+        extent = store[EXTENTKEY]
+    return extent['start'], extent['end']
+
+
+def block_starts(dates, freq):
+    """start of year or month block of dates"""
+    unit = FREQUNITS[freq]
+    dates = np.asarray(dates, dtype='M8[ns]')
+    return dates.astype('M8[{}]'.format(unit)).astype('M8[ns]')
+
+
+def split_period(period, freq):
+    """Split period (start, end) into whole blocks and partial edges.
+
+    Args:
+        period (tuple): start, end Timestamps, inclusive, or None
+        freq (str): 'year' or 'month'
+
+    Returns:
+        tuple: inclusive period of block starts of whole blocks (None if
+            there are no whole blocks), list of inclusive edge periods
+    """
+    if period is None:
+        return (None, None), []
+    start, end = (pd.Timestamp(t) for t in period)
+    unit = 'M8[{}]'.format(FREQUNITS[freq])
+    first = start.to_datetime64().astype(unit)
+    if pd.Timestamp(first) < start:
+        first += 1
+    first = pd.Timestamp(first)
+    last = pd.Timestamp(
+        (end + pd.Timedelta(1, 'ns')).to_datetime64().astype(unit))
+    if not first < last:
+        return None, [(start, end)]
+    edges = []
+    if start < first:
+        edges.append((start, first - pd.Timedelta(1, 'ns')))
+    if last <= end:
+        edges.append((last, end))
+    return (first, last - pd.Timedelta(1, 'ns')), edges
+
+
+def read_blocks(path, blockperiod, locations=None, keys=None):
+    """read block sums with block start in inclusive blockperiod"""
+    return storage.read(path, BLOCKSKEY,
+                        period=blockperiod,
+                        locations=locations,
+                        keys=keys,
+                        )
+
+
+def read_rows(path, period, locations=None, keys=None):
+    """read observed and aligned model rows in inclusive period"""
+    return storage.read(path, ROWSKEY,
+                        period=period,
+                        locations=locations,
+                        keys=keys,
+                        )
+
+
+def read_outside(path, rowperiod, period, locations=None, keys=None):
+    """read aligned rows in inclusive rowperiod with model timestamp
+    outside inclusive period"""
+    start, end = (pd.Timestamp(t) for t in period)
+    where = storage.hdf5_where(ROWLEVELS,
+                               period=rowperiod,
+                               locations=storage.selected_locations(
+                                   locations=locations, keys=keys),
+                               )
+    where.append('(modeltime < {start!r} | modeltime > {end!r})'.format(
+        start=str(start), end=str(end)))
+    with pd.HDFStore(path, 'r') as store:
+        rows = store.select(ROWSKEY, where=where)
+    return storage.select(rows, locations=locations, keys=keys)
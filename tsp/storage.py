@@ -0,0 +1,471 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# package
+from tsp.config import config
+from tsp import manifest
+
+# 3rd party
+import pandas as pd
+import numpy as np
+
+# std
+from collections import OrderedDict
+import logging
+import shutil
+import json
+import glob
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+HDF5 = 'hdf5'
+PARQUET = 'parquet'
+ARROW = 'arrow'
+
+EXTENSIONS = {
+    '.h5': HDF5,
+    '.hdf5': HDF5,
+    '.hdf': HDF5,
+    '.parquet': PARQUET,
+    '.arrow': ARROW,
+    '.ipc': ARROW,
+}
+
+PARTEXTENSIONS = {
+    PARQUET: '.parquet',
+    ARROW: '.arrow',
+}
+
+METADATAKEY = b'tsp'
+
+
+def storeformat(path):
+    """storage format of store file or folder by extension"""
+    ext = os.path.splitext(path.rstrip('/\\'))[1].lower()
+    try:
+        return EXTENSIONS[ext]
+    except KeyError:
+        raise ValueError('{path:} is not a HDF5, Parquet or Arrow store'.format(
+            path=path))
+
+
+def isstore(path):
+    """True if path has the extension of a supported store"""
+    ext = os.path.splitext(path.rstrip('/\\'))[1].lower()
+    return ext in EXTENSIONS
+
+
+def partfiles(path, key):
+    """sorted list of partition files of table in Parquet or Arrow store"""
+    ext = PARTEXTENSIONS[storeformat(path)]
+    pattern = os.path.join(path, key, 'part-*{ext:}'.format(ext=ext))
+    return sorted(glob.glob(pattern))
+
+
+def partitions(table, partitionsize):
+    """yield consecutive slices of sorted table of about partitionsize rows,
+    split at location boundaries"""
+    nrows = len(table)
+    if (partitionsize is None) or (nrows <= partitionsize):
+        yield table
+        return
+    locations = table.index.get_level_values(0)
+    isfirst = np.ones(nrows, dtype=bool)
+    isfirst[1:] = locations[1:] != locations[:-1]
+    starts = np.flatnonzero(isfirst)
+    targets = np.arange(partitionsize, nrows, partitionsize)
+    cuts = starts[np.searchsorted(starts, targets).clip(max=len(starts) - 1)]
+    bounds = np.unique(np.concatenate([[0], cuts[cuts > 0], [nrows]]))
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        yield table.iloc[first:last]
+
+
+def write(path, key, table,
+          hdf5format=config.STORE_HDF5FORMAT,
+          partitionsize=config.STORE_PARTITIONSIZE,
+          rowgroupsize=config.STORE_ROWGROUPSIZE):
+    """Write series or table with (location, filternr[, date_time]) index to
+    store.
+
+    HDF5 stores hold all tables in one file, in 'fixed' or (indexed,
+    queryable) 'table' format. Parquet and Arrow IPC stores
+    are folders with a subfolder per table, holding partition files sorted
+    by index, split at location boundaries. Parquet row groups and Arrow
+    record batches hold at most rowgroupsize rows.
+
+    Args:
+        path (str): path to store file (.h5) or folder (.parquet, .arrow)
+        key (str): table name
+        table (Series or DataFrame): table with MultiIndex
+        hdf5format (str, optional): HDF5 format, 'fixed' or 'table'
+        partitionsize (int, optional): approximate rows per partition file
+        rowgroupsize (int, optional): maximum rows per row group
+    """
+    fmt = storeformat(path)
+    if fmt == HDF5:
+        with pd.HDFStore(path) as store:
+            if hdf5format == 'table':
+                store.put(key, table,
+                          format='table',
+                          min_itemsize={table.index.names[0]:
+                                        config.STORE_LOCATION_ITEMSIZE},
+                          )
+            else:
+                store.put(key, table)
+            manifest.remove(store, key)
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    isseries = isinstance(table, pd.Series)
+    if isseries:
+        table = table.to_frame()
+    table = table.sort_index()
+
+    folder = os.path.join(path, key)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+
+    for i, part in enumerate(partitions(table, partitionsize)):
+        arrowtable = pa.Table.from_pandas(part, preserve_index=True)
+        partmetadata = {
+            'series': isseries,
+            'levels': list(part.index.names),
+            'first': jsonvalue(part.index[0][0]),
+            'last': jsonvalue(part.index[-1][0]),
+        }
+        schemametadata = dict(arrowtable.schema.metadata or {})
+        schemametadata[METADATAKEY] = json.dumps(partmetadata).encode()
+        arrowtable = arrowtable.replace_schema_metadata(schemametadata)
+        partfile = os.path.join(folder, 'part-{i:05d}{ext:}'.format(
+            i=i, ext=PARTEXTENSIONS[fmt]))
+        if fmt == PARQUET:
+            pq.write_table(arrowtable, partfile,
+                           row_group_size=rowgroupsize)
+        else:
+            with pa.OSFile(partfile, 'wb') as sink:
+                with pa.ipc.new_file(sink, arrowtable.schema) as writer:
+                    writer.write_table(arrowtable,
+                                       max_chunksize=rowgroupsize)
+
+
+def jsonvalue(value):
+    """numpy scalar as Python scalar, to store in JSON metadata"""
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def astype_of(values, example):
+    """values converted to type of example, values that cannot be converted
+    are left out"""
+    converted = []
+    for value in values:
+        try:
+            converted.append(type(example)(value))
+        except (TypeError, ValueError):
+            continue
+    return converted
+
+
+def tspmetadata(schema):
+    """tsp metadata stored in Arrow schema"""
+    return json.loads(schema.metadata[METADATAKEY].decode())
+
+
+def select(table, period=None, locations=None, keys=None):
+    """select rows of table in period (start, end), of locations and of
+    (location, filternr) keys. Period bounds are inclusive and only apply to
+    tables with a date_time level."""
+    if (period is not None) and (table.index.nlevels > 2):
+        start, end = period
+        dates = table.index.get_level_values(2)
+        isselected = np.ones(len(table), dtype=bool)
+        if start is not None:
+            isselected &= dates >= pd.Timestamp(start)
+        if end is not None:
+            isselected &= dates <= pd.Timestamp(end)
+        table = table.loc[isselected]
+    if locations is not None:
+        table = table.loc[table.index.get_level_values(0).isin(locations)]
+    if keys is not None:
+        keyindex = pd.MultiIndex.from_tuples(list(keys))
+        isselected = pd.MultiIndex.from_arrays([
+            table.index.get_level_values(0),
+            table.index.get_level_values(1),
+        ]).isin(keyindex)
+        table = table.loc[isselected]
+    return table
+
+
+def selected_locations(locations=None, keys=None):
+    """sorted list of selected locations, None if all locations"""
+    selected = None
+    if locations is not None:
+        selected = set(locations)
+    if keys is not None:
+        keylocations = {location for location, filternr in keys}
+        if selected is None:
+            selected = keylocations
+        else:
+            selected &= keylocations
+    if selected is None:
+        return None
+    return sorted(str(l) for l in selected)
+
+
+def hdf5_where(levels, period=None, locations=None):
+    """HDF5 where conditions for table format node with levels"""
+    where = []
+    if (period is not None) and (len(levels) > 2):
+        start, end = period
+        if start is not None:
+            where.append('{level:} >= {start!r}'.format(
+                level=levels[2], start=str(pd.Timestamp(start))))
+        if end is not None:
+            where.append('{level:} <= {end!r}'.format(
+                level=levels[2], end=str(pd.Timestamp(end))))
+    if locations is not None:
+        where.append('{level:} in {locations!r}'.format(
+            level=levels[0], locations=locations))
+    return where or None
+
+
+def read_hdf5(path, key, period=None, locations=None):
+    """read table from HDF5 store, for table format nodes the period and
+    locations are selected by the store"""
+    with pd.HDFStore(path, 'r') as store:
+        storer = store.get_storer(key)
+        if storer is None:
+            raise KeyError('no table {key:} in store {path:}'.format(
+                key=key, path=path))
+        isselected = (period is not None) or (locations is not None)
+        if storer.is_table and isselected:
+            where = hdf5_where(storer.levels,
+                               period=period,
+                               locations=locations)
+            return store.select(key, where=where)
+        if isselected:
+            log.warning(('table {key:} in store {path:} is in fixed format, '
+                         'reading all rows before selecting').format(
+                key=key, path=os.path.basename(path)))
+        return store[key]
+
+
+def arrow_filter(levels, period=None, locations=None):
+    """Arrow dataset filter expression, None if nothing to filter"""
+    import pyarrow.dataset as ds
+
+    expressions = []
+    if (period is not None) and (len(levels) > 2):
+        start, end = period
+        if start is not None:
+            expressions.append(ds.field(levels[2]) >=
+                               pd.Timestamp(start).to_pydatetime())
+        if end is not None:
+            expressions.append(ds.field(levels[2]) <=
+                               pd.Timestamp(end).to_pydatetime())
+    if locations is not None:
+        expressions.append(ds.field(levels[0]).isin(locations))
+    if not len(expressions) > 0:
+        return None
+    expression = expressions[0]
+    for other in expressions[1:]:
+        expression = expression & other
+    return expression
+
+
+def read_parts(path, key, period=None, locations=None):
+    """read partition files of table in Parquet or Arrow store to pandas.
+    Partition files without selected locations are skipped, other files are
+    memory-mapped or filtered by row group."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    fmt = storeformat(path)
+    files = partfiles(path, key)
+    if not len(files) > 0:
+        raise KeyError('no table {key:} in store {path:}'.format(
+            key=key, path=path))
+
+    # skip partition files by location range
+    schemas = []
+    for partfile in files:
+        if fmt == PARQUET:
+            schemas.append(pq.read_schema(partfile, memory_map=True))
+        else:
+            with pa.memory_map(partfile, 'r') as source:
+                schemas.append(pa.ipc.open_file(source).schema)
+    metadata = tspmetadata(schemas[0])
+    if locations is not None:
+        # compare locations as type of location level
+        locations = astype_of(locations, metadata['first'])
+        files = [f for f, s in zip(files, schemas)
+                 if any(tspmetadata(s)['first'] <= l <= tspmetadata(s)['last']
+                        for l in locations)]
+
+    expression = arrow_filter(metadata['levels'],
+                              period=period,
+                              locations=locations)
+    if not len(files) > 0:
+        arrowtable = schemas[0].empty_table()
+    elif expression is None:
+        arrowtables = []
+        for partfile in files:
+            if fmt == PARQUET:
+                arrowtables.append(pq.read_table(partfile, memory_map=True))
+            else:
+                reader = pa.ipc.open_file(pa.memory_map(partfile, 'r'))
+                arrowtables.append(reader.read_all())
+        arrowtable = pa.concat_tables(arrowtables)
+    else:
+        dsformat = 'parquet' if fmt == PARQUET else 'ipc'
+        arrowtable = ds.dataset(files, format=dsformat).to_table(
+            filter=expression)
+    table = arrowtable.to_pandas()
+    if metadata['series']:
+        table = table.iloc[:, 0]
+    return table
+
+
+class TableCache(object):
+    """Least recently used cache of tables read from stores, keyed by
+    (path, key, selection). Entries are invalidated when the store is
+    modified and evicted when the total size exceeds maxbytes."""
+
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.tables = OrderedDict()
+        self.nbytes = 0
+
+    def get(self, cachekey, mtime):
+        """cached table, None if not cached or store modified"""
+        if cachekey not in self.tables:
+            return None
+        table, cachedmtime, nbytes = self.tables[cachekey]
+        if cachedmtime != mtime:
+            self.pop(cachekey)
+            return None
+        self.tables.move_to_end(cachekey)
+        return table
+
+    def put(self, cachekey, mtime, table):
+        """add table to cache, evicting least recently used tables"""
+        self.pop(cachekey)
+        nbytes = tablebytes(table)
+        if nbytes > self.maxbytes:
+            return
+        while self.nbytes + nbytes > self.maxbytes:
+            self.pop(next(iter(self.tables)))
+        self.tables[cachekey] = (table, mtime, nbytes)
+        self.nbytes += nbytes
+
+    def pop(self, cachekey):
+        """remove table from cache, if cached"""
+        if cachekey in self.tables:
+            table, mtime, nbytes = self.tables.pop(cachekey)
+            self.nbytes -= nbytes
+
+    def clear(self):
+        """remove all tables from cache"""
+        self.tables.clear()
+        self.nbytes = 0
+
+
+def tablebytes(table):
+    """memory size of series or table including index"""
+    nbytes = table.memory_usage(index=True)
+    if isinstance(nbytes, pd.Series):
+        nbytes = nbytes.sum()
+    return int(nbytes)
+
+
+def modified(path, key):
+    """modification time of table in store"""
+    if storeformat(path) == HDF5:
+        return os.path.getmtime(path)
+    folder = os.path.join(path, key)
+    if not os.path.exists(folder):
+        return None
+    return max([os.path.getmtime(folder)] +
+               [os.path.getmtime(f) for f in partfiles(path, key)])
+
+
+def cachekey(path, key, period=None, locations=None, keys=None):
+    """hashable cache key of table selection"""
+    if period is not None:
+        period = tuple(None if t is None else pd.Timestamp(t)
+                       for t in period)
+    if locations is not None:
+        locations = tuple(sorted(str(l) for l in locations))
+    if keys is not None:
+        keys = tuple(sorted((str(l), int(f)) for l, f in keys))
+    return os.path.abspath(path), key, period, locations, keys
+
+
+tablecache = TableCache(maxbytes=config.CACHE_MAXBYTES)
+
+
+def read_uncached(path, key, period=None, locations=None, keys=None):
+    """read selection of series or table from store, see read"""
+    selectedlocations = selected_locations(locations=locations, keys=keys)
+    if storeformat(path) == HDF5:
+        table = read_hdf5(path, key,
+                          period=period,
+                          locations=selectedlocations)
+    else:
+        table = read_parts(path, key,
+                           period=period,
+                           locations=selectedlocations)
+    return select(table, period=period, locations=locations, keys=keys)
+
+
+def read(path, key, period=None, locations=None, keys=None, cache=True):
+    """Read series or table from HDF5, Parquet or Arrow store.
+
+    Selections are pushed down to the store where possible: HDF5 table
+    format nodes are queried, Parquet and Arrow partition files are skipped
+    by location range and filtered by row group. Remaining rows are
+    selected in memory.
+
+    Tables are cached by (path, key, selection) for the lifetime of the
+    process, until the store is modified. The cache size is limited by
+    config.CACHE_MAXBYTES.
+
+    Args:
+        path (str): path to store file (.h5) or folder (.parquet, .arrow)
+        key (str): table name
+        period (tuple, optional): (start, end) of date_time, inclusive
+        locations (list, optional): selected locations
+        keys (list, optional): selected (location, filternr) tuples
+        cache (bool, optional): use table cache
+
+    Returns:
+        Series or DataFrame: selected rows of table
+    """
+    if not (cache and tablecache.maxbytes > 0):
+        return read_uncached(path, key,
+                             period=period,
+                             locations=locations,
+                             keys=keys)
+    selection = cachekey(path, key,
+                         period=period,
+                         locations=locations,
+                         keys=keys)
+    mtime = modified(path, key)
+    table = tablecache.get(selection, mtime)
+    if table is None:
+        table = read_uncached(path, key,
+                              period=period,
+                              locations=locations,
+                              keys=keys)
+        tablecache.put(selection, mtime, table)
+    else:
+        log.debug('reading {key:} from cache'.format(key=key))
+    # shallow copy, callers set names
+    return table.copy(deep=False)
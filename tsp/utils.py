@@ -3,8 +3,14 @@
 # Tom van Steijn, Royal HaskoningDHV
 
 from tsp.config import config
+from tsp import storage
 
 import pandas as pd
+import numpy as np
+
+from collections import OrderedDict
+import gzip
+import os
 
 
 def cleaned(dirtystring):
@@ -39,8 +45,128 @@ def table_from_record(
         record,
         filefield='file',
         tablefield='table',
-        namefield='name'):
-    with pd.HDFStore(record.pop(filefield), 'r') as store:
-        table = store[record.pop(tablefield)]
-        table.name = record.pop(namefield)
-        return table
+        namefield='name',
+        period=None,
+        locations=None,
+        keys=None):
+    """read table from store in record, optionally selecting rows in period
+    (start, end), of locations or of (location, filternr) keys"""
+    table = storage.read(record.pop(filefield), record.pop(tablefield),
+                         period=period,
+                         locations=locations,
+                         keys=keys,
+                         )
+    # rows replaced in incremental runs are appended at the end
+    if not table.index.is_monotonic_increasing:
+        table = table.sort_index()
+    table.name = record.pop(namefield, None)
+    return table
+
+
+def first_last(observed, model):
+    """start and end from first and last (location, filternr, date_time)
+    of observed and model"""
+    start = min(observed.index[0], model.index[0])[2]
+    end = max(observed.index[-1], model.index[-1])[2]
+    return start, end
+
+
+# file extensions of export formats
+EXPORTEXTENSIONS = OrderedDict([
+    ('csv', '.csv'),
+    ('csv.gz', '.csv.gz'),
+    ('parquet', '.parquet'),
+    ('hdf5', '.h5'),
+])
+
+
+def exportpath(path, exportformat):
+    """path with extension of export format, replacing extension of any
+    export format"""
+    if exportformat not in EXPORTEXTENSIONS:
+        raise ValueError('unknown export format {!r}, use one of {}'.format(
+            exportformat, ', '.join(EXPORTEXTENSIONS)))
+    for ext in sorted(EXPORTEXTENSIONS.values(), key=len, reverse=True):
+        if path.lower().endswith(ext):
+            path = path[:-len(ext)]
+            break
+    return path + EXPORTEXTENSIONS[exportformat]
+
+
+def export(table, path, exportformat='csv', key='table',
+           chunksize=config.STATS_EXPORTCHUNKSIZE):
+    """Export series or summary table to file.
+
+    Args:
+        table (DataFrame): table to export
+        path (str): export file, with extension of export format
+        exportformat (str, optional): 'csv' (plain text), 'csv.gz'
+            (gzip-compressed CSV), 'parquet' or 'hdf5' (table format,
+            indexed on all index levels except date_time, i.e.
+            (location, filternr) for series)
+        key (str, optional): table name in HDF5 file
+        chunksize (int, optional): number of rows per CSV chunk
+    """
+    if exportformat in ('csv', 'csv.gz'):
+        opener = gzip.open if exportformat == 'csv.gz' else open
+        with opener(path, 'wt', newline='') as f:
+            for i in range(0, max(len(table), 1), chunksize):
+                table.iloc[i:i + chunksize].to_csv(f, header=(i == 0))
+    elif exportformat == 'parquet':
+        table.to_parquet(path)
+    elif exportformat == 'hdf5':
+        # single level index is stored as column 'index'
+        levels = [table.index.get_level_values(i)
+                  for i in range(table.index.nlevels)]
+        name = lambda l: l.name if table.index.nlevels > 1 else 'index'
+        names = [name(l) for l in levels if not l.dtype.kind == 'M']
+        itemsizes = {name(l): config.STORE_LOCATION_ITEMSIZE for l in levels
+                     if pd.api.types.is_string_dtype(l)}
+        if os.path.exists(path):
+            os.remove(path)
+        with pd.HDFStore(path) as store:
+            store.append(key, table,
+                         index=False,
+                         min_itemsize=itemsizes,
+                         )
+            store.create_table_index(key, columns=names, kind='full')
+    else:
+        raise ValueError('unknown export format {!r}, use one of {}'.format(
+            exportformat, ', '.join(EXPORTEXTENSIONS)))
+
+
+def combine_codes(codes, sizes):
+    """combine integer codes of several keys into single int64 code"""
+    combined = np.zeros(len(codes[0]), dtype=np.int64)
+    for c, size in zip(codes, sizes):
+        combined = combined * size + np.asarray(c)
+    return combined
+
+
+def split_codes(combined, sizes):
+    """split combined int64 codes into integer codes of each key"""
+    codes = []
+    for size in reversed(sizes):
+        codes.insert(0, combined % size)
+        combined = combined // size
+    return codes
+
+
+def group_ids(index, nlevels=2):
+    """Integer group ids of rows of MultiIndex grouped by its first nlevels
+    levels.
+
+    Args:
+        index (MultiIndex): index with at least nlevels levels
+        nlevels (int, optional): number of levels to group by
+
+    Returns:
+        tuple: array of group id by row, sorted MultiIndex of groups
+    """
+    sizes = [len(index.levels[level]) for level in range(nlevels)]
+    combined = combine_codes(index.codes[:nlevels], sizes)
+    ids, uniques = pd.factorize(combined, sort=True)
+    arrays = [index.levels[level][c]
+              for level, c in enumerate(split_codes(uniques, sizes))]
+    groups = pd.MultiIndex.from_arrays(arrays, names=index.names[:nlevels])
+    return ids, groups